@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+from eda.autocorrelation import acf, acf_frame, significance, _autocor_figure, OnlineACF
+from .data import random_walk, wide_frame
+
+
+class Acf:
+    params = [[1000, 100000, 1000000]]
+    param_names = ['n']
+
+    def setup(self, n):
+        self.series = random_walk(n)
+        self.coeffs = acf(self.series, max_lag = 500)
+        self.bands = significance(self.series)
+
+    def time_acf(self, n):
+        acf(self.series)
+
+    def time_acf_max_lag(self, n):
+        acf(self.series, max_lag = 500)
+
+    def peakmem_acf(self, n):
+        acf(self.series)
+
+    def time_figure(self, n):
+        _autocor_figure(self.coeffs, *self.bands)
+
+
+class AcfFrame:
+    params = [[10000, 100000], [10, 100]]
+    param_names = ['n', 'columns']
+
+    def setup(self, n, columns):
+        self.df = wide_frame(n, columns)
+
+    def time_acf_frame(self, n, columns):
+        acf_frame(self.df, max_lag = 200)
+
+    def peakmem_acf_frame(self, n, columns):
+        acf_frame(self.df, max_lag = 200)
+
+
+class OnlineAcf:
+    params = [[100, 10000]]
+    param_names = ['batch']
+
+    def setup(self, batch):
+        self.history = random_walk(100000).values
+        self.batch = random_walk(batch, seed = 1).values
+        self.online = OnlineACF(max_lag = 200).update(self.history)
+
+    def time_update(self, batch):
+        self.online.update(self.batch)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+from eda.boxplot import boxplot_data, box_data, ts_box_data, box_plot
+from .data import random_walk, wide_frame
+
+
+class BoxData:
+    params = [[1000, 100000], [10, 200, 2000]]
+    param_names = ['n', 'columns']
+
+    def setup(self, n, columns):
+        if n * columns > 20000000:
+            raise NotImplementedError()
+        self.df = wide_frame(n, columns)
+
+    def time_box_data(self, n, columns):
+        box_data(self.df)
+
+    def peakmem_box_data(self, n, columns):
+        box_data(self.df)
+
+
+class BoxplotData:
+    params = [[100000, 1000000], [False, True]]
+    param_names = ['n', 'approximate']
+
+    def setup(self, n, approximate):
+        self.series = random_walk(n)
+
+    def time_boxplot_data(self, n, approximate):
+        boxplot_data(self.series, approximate = approximate)
+
+    def peakmem_boxplot_data(self, n, approximate):
+        boxplot_data(self.series, approximate = approximate)
+
+
+class TsBoxData:
+    params = [[100000, 1000000], ['W', 'D']]
+    param_names = ['n', 'freq']
+
+    def setup(self, n, freq):
+        self.series = random_walk(n)
+
+    def time_ts_box_data(self, n, freq):
+        ts_box_data(self.series, freq = freq)
+
+    def peakmem_ts_box_data(self, n, freq):
+        ts_box_data(self.series, freq = freq)
+
+
+class BoxPlot:
+    params = [[52, 520]]
+    param_names = ['boxes']
+
+    def setup(self, boxes):
+        df, self.ol = ts_box_data(random_walk(boxes * 7 * 24, freq = 'h'), freq = 'W')
+        self.df = df.reset_index()
+
+    def time_figure(self, boxes):
+        box_plot('date', self.df, outliers = self.ol)
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+from eda.control import control_limits, control_rules, control_plot
+from .data import random_walk
+
+
+class Control:
+    params = [[10000, 1000000]]
+    param_names = ['n']
+
+    def setup(self, n):
+        self.series = random_walk(n)
+
+    def time_control_limits(self, n):
+        control_limits(self.series)
+
+    def time_control_rules(self, n):
+        control_rules(self.series, rules = 'nelson')
+
+    def peakmem_control_rules(self, n):
+        control_rules(self.series, rules = 'nelson')
+
+    def time_figure(self, n):
+        control_plot(self.series)
+
+    def time_figure_max_points(self, n):
+        control_plot(self.series, max_points = 2000)
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Import cost of the package.  Importing eda.plot or the statistics 
+modules must not pull in bokeh, scikit-learn or rpy2; those load only
+when a figure or backend is used.
+"""
+
+import subprocess
+import sys
+
+HEAVY = ('bokeh', 'sklearn', 'rpy2')
+
+CHECK = """
+import sys
+import eda.plot, eda.autocorrelation, eda.boxplot, eda.control, eda.io, eda.matrix, eda.stl
+print(sum(1 for name in sys.modules if name.split('.')[0] in {!r}))
+""".format(HEAVY)
+
+
+def timeraw_import_plot():
+    return "import eda.plot"
+
+
+def timeraw_import_stats():
+    return "import eda.autocorrelation, eda.boxplot, eda.control, eda.io, eda.matrix, eda.stl"
+
+
+def track_heavy_modules_on_import():
+    """
+    number of bokeh, sklearn and rpy2 modules loaded by importing eda, 
+    which should stay 0
+    """
+    output = subprocess.check_output([sys.executable, '-c', CHECK])
+    return int(output.decode().strip())
+
+track_heavy_modules_on_import.unit = 'modules'
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+from eda.matrix import get_best_poly, sample_poly_fit, get_bagged_poly, fit_pairs, bk_matrix
+from .data import wide_frame
+
+
+class BestPoly:
+    params = [[1000, 100000], ['random', 'loo', 'kfold']]
+    param_names = ['n', 'cv']
+
+    def setup(self, n, cv):
+        df = wide_frame(n, 2)
+        self.x = df['c0'].values
+        self.y = df['c1'].values
+
+    def time_get_best_poly(self, n, cv):
+        get_best_poly(self.x, self.y, 3, 20, random_state = 0, cv = cv)
+
+    def peakmem_get_best_poly(self, n, cv):
+        get_best_poly(self.x, self.y, 3, 20, random_state = 0, cv = cv)
+
+
+class SamplePolyFit:
+    # the default cross validation of bk_circle(best_poly = True), at the
+    # sizes the density mode draws
+    params = [[1000000, 3000000]]
+    param_names = ['n']
+    timeout = 300
+
+    def setup(self, n):
+        df = wide_frame(n, 2)
+        self.x = df['c0'].values
+        self.y = df['c1'].values
+
+    def time_sample_poly_fit(self, n):
+        sample_poly_fit(self.x, self.y, 3, 20, random_state = 0)
+
+    def peakmem_sample_poly_fit(self, n):
+        sample_poly_fit(self.x, self.y, 3, 20, random_state = 0)
+
+
+class BaggedPoly:
+    params = [[1000, 100000], [10, 1000]]
+    param_names = ['n', 'bags']
+
+    def setup(self, n, bags):
+        df = wide_frame(n, 2)
+        self.x = df['c0'].values
+        self.y = df['c1'].values
+
+    def time_get_bagged_poly(self, n, bags):
+        get_bagged_poly(self.x, self.y, 3, bags, rng = 0)
+
+
+class Matrix:
+    params = [[1000, 10000], [3, 8]]
+    param_names = ['n', 'columns']
+
+    def setup(self, n, columns):
+        self.df = wide_frame(n, columns)
+
+    def time_fit_pairs(self, n, columns):
+        fit_pairs(self.df, workers = 1)
+
+    def time_figure(self, n, columns):
+        bk_matrix(self.df)
+
+    def peakmem_figure(self, n, columns):
+        bk_matrix(self.df)
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+from eda.stl import stl, decompose, decompose_batch, stl_plot
+from .data import seasonal, wide_frame
+
+
+class Decompose:
+    params = [[1000, 100000], [24, 168]]
+    param_names = ['n', 'period']
+
+    def setup(self, n, period):
+        self.series = seasonal(n, period)
+
+    def time_stl(self, n, period):
+        stl(self.series.values, period)
+
+    def time_stl_robust(self, n, period):
+        stl(self.series.values, period, s_window = 13, robust = True)
+
+    def time_decompose(self, n, period):
+        decompose(self.series, period)
+
+    def peakmem_decompose(self, n, period):
+        decompose(self.series, period)
+
+    def time_figure(self, n, period):
+        stl_plot(self.series, period, max_points = 2000)
+
+
+class DecomposeBatch:
+    params = [[10, 100]]
+    param_names = ['columns']
+
+    def setup(self, columns):
+        self.df = wide_frame(2000, columns).cumsum()
+
+    def time_decompose_batch(self, columns):
+        decompose_batch(self.df, 24, workers = 1)
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Seeded synthetic data for the benchmarks, so every run times the same
+inputs without reading anything from disk or the network.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def random_walk(n, seed = 0, freq = 'min'):
+    """
+    a gaussian random walk of n points on a datetime index
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2000-01-01', periods = n, freq = freq)
+    return pd.Series(rng.standard_normal(n).cumsum(), index = index)
+
+
+def seasonal(n, period, seed = 0, freq = 'h'):
+    """
+    a seasonal series of n points: a sine of the given period, a linear
+    trend and gaussian noise, on a datetime index
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    values = 10 * np.sin(2 * np.pi * t / period) + .01 * t + rng.standard_normal(n)
+    index = pd.date_range('2000-01-01', periods = n, freq = freq)
+    return pd.Series(values, index = index)
+
+
+def wide_frame(n, columns, seed = 0):
+    """
+    a frame of n rows and the given number of correlated, heavy tailed
+    columns, the kind of sensor export box_data and bk_matrix summarize
+    """
+    rng = np.random.default_rng(seed)
+    base = rng.standard_normal((n, 1))
+    values = .5 * base + rng.standard_t(3, size = (n, columns))
+    return pd.DataFrame(values, columns = ['c{}'.format(i) for i in range(columns)])
@@ -1,12 +1,34 @@
 # -*- coding: utf-8 -*-
 import pandas as pd
 import numpy as np
-from bokeh.plotting import figure
-from bokeh.io import curdoc
+from eda.profiling import stage
+from eda.cache import cached
 
 
 
-def acf(series:pd.core.series.Series) -> pd.core.series.Series:
+def _next_pow2(n):
+    """
+    smallest power of two greater than or equal to n, used as the zero
+    padded fft length so the circular correlation does not wrap around
+    """
+    return 1 << (int(n) - 1).bit_length()
+
+
+def _acovf(data, max_lag):
+    """
+    autocovariance of a 1-d array, or of every column of a 2-d array,
+    for lags 0 to max_lag computed in one zero padded fft along axis 0
+    """
+    n = data.shape[0]
+    x = data - np.mean(data, axis = 0)
+    nfft = _next_pow2(2 * n - 1)
+    f = np.fft.rfft(x, n = nfft, axis = 0)
+    acov = np.fft.irfft(f * np.conjugate(f), n = nfft, axis = 0)
+    return acov[:max_lag + 1] / float(n)
+
+
+@cached
+def acf(series:pd.core.series.Series, max_lag = None) -> pd.core.series.Series:
     """
     Autocorrelation, also known as serial correlation, is the correlation 
     of a signal with a delayed copy of itself as a function of delay. 
@@ -18,27 +40,176 @@ def acf(series:pd.core.series.Series) -> pd.core.series.Series:
     It is often used in signal processing for analyzing functions or series 
     of values, such as time domain signals.
     
+    The lagged products are computed with a zero padded fft, so the
+    whole call is O(n log n) instead of one O(n) pass per lag.
     
     params:
         series: a time series
+        max_lag: the largest lag to return, defaults to len(series) - 1
     
     returns:
-        acf_coeffs: the autocorrelation at lag (index)
+        acf_coeffs: the autocorrelation at lag (index), full precision
     
     """
-    n = len(series)
-    data = np.asarray(series)
-    mean = np.mean(data)
-    c0 = np.sum((data - mean) ** 2) / float(n)
-    def r(h):
-        acf_lag = ((data[:n - h] - mean) * (data[h:] - mean)).sum() / float(n) / c0
-        return round(acf_lag, 3)
-    x = np.arange(n) # Avoiding lag 0 calculation
-    acf_coeffs = pd.Series(map(r, x)).round(decimals = 3)
-    acf_coeffs = acf_coeffs + 0
+    data = np.asarray(series, dtype = float)
+    n = len(data)
+    if max_lag is None or max_lag > n - 1:
+        max_lag = n - 1
+    acov = _acovf(data, max_lag)
+    acf_coeffs = pd.Series(acov / acov[0])
     return acf_coeffs
 
 
+def acf_frame(df:pd.core.frame.DataFrame, max_lag = None) -> pd.core.frame.DataFrame:
+    """
+    acf_frame calculates the autocorrelation of every column in a pandas
+    df in a single vectorized pass, instead of calling acf per column.
+    Columns should be free of missing values, as with acf.
+    
+    params:
+        df: pandas dataframe of time series, one per column
+        max_lag: the largest lag to return, defaults to len(df) - 1
+    
+    returns:
+        acf_df: lag (index) x column dataframe of autocorrelations
+    
+    """
+    data = np.asarray(df, dtype = float)
+    n = data.shape[0]
+    if max_lag is None or max_lag > n - 1:
+        max_lag = n - 1
+    acov = _acovf(data, max_lag)
+    acf_df = pd.DataFrame(acov / acov[0], columns = df.columns)
+    acf_df.index.name = 'lag'
+    return acf_df
+
+
+def ccf_frame(df:pd.core.frame.DataFrame, lags = (0, 1)) -> pd.core.frame.DataFrame:
+    """
+    ccf_frame calculates the pairwise cross-correlation of every column in
+    a pandas df at the chosen lags.  The value at (lag, a), b is the
+    correlation of a at time t + lag with b at time t, so lag 0 is the
+    ordinary correlation matrix.  Each lag is one matrix product over
+    all the columns.
+    
+    params:
+        df: pandas dataframe of time series, one per column
+        lags: iterable of non-negative lags
+    
+    returns:
+        ccf_df: dataframe indexed by (lag, column) with one column per 
+                column of df
+    
+    """
+    data = np.asarray(df, dtype = float)
+    n = data.shape[0]
+    x = data - np.mean(data, axis = 0)
+    sd = np.sqrt(np.sum(x ** 2, axis = 0) / float(n))
+    lags = [int(lag) for lag in lags]
+    blocks = [np.dot(x[lag:].T, x[:n - lag]) / float(n) / np.outer(sd, sd) for lag in lags]
+    index = pd.MultiIndex.from_product([lags, df.columns], names = ['lag', 'variable'])
+    ccf_df = pd.DataFrame(np.concatenate(blocks), index = index, columns = df.columns)
+    return ccf_df
+
+
+class OnlineACF:
+    """
+    OnlineACF keeps running sums so the autocorrelation of a growing
+    series can be refreshed without rescanning its history.  It holds the
+    count, the sum and sum of squares, the lagged cross-products up to 
+    max_lag and the first and last max_lag values, which are all that is
+    needed to remove the mean from the lagged products.  Appending a batch 
+    costs O(batch x max_lag).  Values are shifted by the first observation
+    to keep the raw sums well conditioned.
+    
+    params:
+        max_lag: the largest lag to track
+    
+    usage:
+        online = OnlineACF(max_lag = 100)
+        online.update(history)
+        online.update(new_points)
+        p = online.autocor()
+    
+    """
+    
+    def __init__(self, max_lag):
+        self.max_lag = int(max_lag)
+        self.n = 0
+        self.shift = None
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.products = np.zeros(self.max_lag + 1)
+        self.head = np.zeros(0)
+        self.tail = np.zeros(0)
+    
+    def update(self, values):
+        """
+        append a batch of new observations
+        
+        params:
+            values: array-like or pandas series of new observations, in order
+        
+        returns:
+            self
+        """
+        batch = np.asarray(values, dtype = float).ravel()
+        if len(batch) == 0:
+            return self
+        if self.shift is None:
+            self.shift = batch[0]
+        batch = batch - self.shift
+        buf = np.concatenate([self.tail, batch])
+        start = len(self.tail)
+        m = len(batch)
+        for h in range(min(self.max_lag, len(buf) - 1) + 1):
+            lo = max(start, h)
+            self.products[h] += np.dot(buf[lo:start + m], buf[lo - h:start + m - h])
+        self.n += m
+        self.total += batch.sum()
+        self.total_sq += np.dot(batch, batch)
+        if len(self.head) < self.max_lag:
+            self.head = np.concatenate([self.head, batch[:self.max_lag - len(self.head)]])
+        self.tail = buf[-self.max_lag:] if self.max_lag else buf[:0]
+        return self
+    
+    def acf(self) -> pd.core.series.Series:
+        """
+        returns:
+            acf_coeffs: the autocorrelation at lag (index) of everything 
+                        appended so far, as acf(history, max_lag) would,
+                        NaN when nothing has been appended
+        """
+        n = self.n
+        if n == 0:
+            return pd.Series(np.full(self.max_lag + 1, np.nan))
+        lags = np.arange(min(self.max_lag, n - 1) + 1)
+        mean = self.total / n
+        head_sums = np.concatenate([[0.0], np.cumsum(self.head)])[lags]
+        tail_sums = np.concatenate([[0.0], np.cumsum(self.tail[::-1])])[lags]
+        lead = self.total - head_sums
+        lagged = self.total - tail_sums
+        acov = (self.products[lags] - mean * (lead + lagged) + (n - lags) * mean ** 2) / float(n)
+        return pd.Series(acov / acov[0])
+    
+    def significance(self):
+        n = self.n
+        if n == 0:
+            return (np.nan, np.nan)
+        z95 = 1.959963984540054 / np.sqrt(n)
+        z99 = 2.5758293035489004 / np.sqrt(n)
+        return(z95,z99)
+    
+    def autocor(self, theme = False, title = 'Time Series Auto-Correlation'):
+        """
+        returns:
+            p: a bokeh plotting figure of the current autocorrelation, 
+               drawn the same way as autocor
+        """
+        z95, z99 = self.significance()
+        return _autocor_figure(self.acf(), z95, z99, theme = theme, title = title)
+
+
 def significance(series):
     
     n = len(series)
@@ -46,7 +217,7 @@ def significance(series):
     z99 = 2.5758293035489004 / np.sqrt(n)
     return(z95,z99)
     
-def autocor(series:pd.core.series.Series, theme = False, title = 'Time Series Auto-Correlation'):
+def autocor(series:pd.core.series.Series, theme = False, title = 'Time Series Auto-Correlation', max_lag = None):
     """
     Autocorrelation plots are often used for checking randomness in time series. 
     This is done by computing autocorrelations for data values at varying time lags. 
@@ -58,6 +229,7 @@ def autocor(series:pd.core.series.Series, theme = False, title = 'Time Series Au
     
      params:
         series: a time series
+        max_lag: the largest lag to compute and plot, defaults to every lag
     
     returns:
         p: a bokeh plotting figure of the series' autocorrelation
@@ -65,9 +237,22 @@ def autocor(series:pd.core.series.Series, theme = False, title = 'Time Series Au
     
     """
      
-    x = pd.Series(range(1, len(series)+1), dtype = float)
-    z95, z99 = significance(series)
-    y = acf(series)
+    with stage('autocor', 'compute', rows = len(series)):
+        z95, z99 = significance(series)
+        y = acf(series, max_lag = max_lag)
+    with stage('autocor', 'figure', rows = len(y)):
+        return _autocor_figure(y, z95, z99, theme = theme, title = title)
+
+
+def _autocor_figure(y, z95, z99, theme = False, title = 'Time Series Auto-Correlation'):
+    """
+    draws autocorrelation coefficients y with the z95 and z99 significance 
+    bands, shared by autocor and OnlineACF.autocor
+    """
+    from bokeh.plotting import figure
+    from bokeh.io import curdoc
+    y = y.round(decimals = 3)
+    x = pd.Series(range(1, len(y)+1), dtype = float)
     p = figure(title=title, plot_width=1000,
                plot_height=500, x_axis_label="Lag", y_axis_label="Autocorrelation")
     p.line(x, z99, line_dash='dashed', line_color='grey', line_width = 2)
@@ -80,4 +265,43 @@ def autocor(series:pd.core.series.Series, theme = False, title = 'Time Series Au
         doc = curdoc()
         doc.theme = theme
         doc.add_root(p)
-    return p
\ No newline at end of file
+    return p
+
+def autocor_heatmap(df:pd.core.frame.DataFrame, max_lag = 50, theme = False, title = 'Auto-Correlation by Column'):
+    """
+    autocor_heatmap plots the autocorrelation of every column in a pandas
+    df as a single lag x column image, so hundreds of series can be 
+    screened in one figure instead of one autocor figure each.  Cells 
+    inside the 95% confidence band are set to zero so only significant
+    lags are colored.
+    
+    params:
+        df: pandas dataframe of time series, one per column
+        max_lag: the largest lag to plot
+    
+    returns:
+        p: a bokeh plotting figure of the columns' autocorrelation
+    
+    """
+    from bokeh.plotting import figure
+    from bokeh.io import curdoc
+    from bokeh.models import LinearColorMapper, ColorBar
+    from bokeh.palettes import RdBu11
+    y = acf_frame(df, max_lag = max_lag)
+    z95, z99 = significance(df)
+    image = y.values.T.copy()
+    image[np.abs(image) < z95] = 0
+    k = len(df.columns)
+    mapper = LinearColorMapper(palette = RdBu11, low = -1, high = 1)
+    p = figure(title=title, plot_width=1000, plot_height=max(300, 15 * k),
+               x_range=(0, len(y)), y_range=(0, k), 
+               x_axis_label="Lag", y_axis_label="Column")
+    p.image(image=[image], x=0, y=0, dw=len(y), dh=k, color_mapper=mapper)
+    p.yaxis.ticker = [i + .5 for i in range(k)]
+    p.yaxis.major_label_overrides = {i + .5:str(c) for i, c in enumerate(df.columns)}
+    p.add_layout(ColorBar(color_mapper=mapper, location=(0, 0)), 'right')
+    if theme:
+        doc = curdoc()
+        doc.theme = theme
+        doc.add_root(p)
+    return p
@@ -1,18 +1,159 @@
 # -*- coding: utf-8 -*-
 
 import pandas as pd
-from bokeh.plotting import figure
+import numpy as np
+import warnings
 from math import pi
-from bokeh.palettes import all_palettes
-from bokeh.io import curdoc
-colors = all_palettes['Colorblind'][8]
+from eda.profiling import stage
+from eda.cache import cached
 
 
 
-def boxplot_data(series):
+class QuantileSketch:
+    """
+    QuantileSketch is a mergeable KLL style quantile sketch, so boxplot
+    data can be built chunk by chunk and combined across partitions or 
+    workers without holding the data in memory.  Items are kept in 
+    levels of at most k values, an item at level h standing for 2**h 
+    observations.  When a level overflows it is sorted and every other 
+    item, from a random offset, is promoted to the next level.  Count, 
+    mean and variance are tracked exactly.
+    
+    Error bound: a compaction at level h moves any rank by at most 2**h 
+    and a level is compacted at most n / (k * 2**h) times, so the rank 
+    error of a quantile is at most n * log2(n / k) / k in the worst case.
+    The random offsets make these errors cancel, and the typical error is
+    closer to n * sqrt(log2(n / k)) / k, about 1% of n for k = 200 and a 
+    billion observations.
+    
+    params:
+        k: number of items kept per level, larger is more accurate
+        seed: seed for the compaction offsets
+    
+    usage:
+        sketch = QuantileSketch()
+        for chunk in chunks:
+            sketch.update(chunk)
+        sketch.merge(other_sketch)
+        sketch.quantile(.5)
+    
+    """
+    
+    def __init__(self, k = 200, seed = None):
+        self.k = int(k)
+        self.rng = np.random.default_rng(seed)
+        self.levels = [np.zeros(0)]
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+    
+    def _add_moments(self, count, mean, m2):
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta ** 2 * self.count * count / float(total)
+        self.mean += delta * count / float(total)
+        self.count = total
+    
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) > self.k:
+                level = np.sort(level)
+                if len(level) % 2:
+                    keep, level = level[-1:], level[:-1]
+                else:
+                    keep = level[:0]
+                promoted = level[self.rng.integers(2)::2]
+                self.levels[h] = keep
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.zeros(0))
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+    
+    def update(self, values):
+        """
+        add a chunk of observations of one series, missing values are 
+        ignored.  A chunk with more than one column raises a ValueError
+        
+        returns:
+            self
+        """
+        values = np.asarray(values, dtype = float)
+        if values.ndim > 1 and values.shape[1] > 1:
+            raise ValueError('a sketch summarizes one series, got a chunk with {} columns'.format(values.shape[1]))
+        values = values.ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        mean = values.mean()
+        self._add_moments(len(values), mean, np.sum((values - mean) ** 2))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+    
+    def merge(self, other):
+        """
+        fold another sketch into this one
+        
+        returns:
+            self
+        """
+        self._add_moments(other.count, other.mean, other.m2)
+        for h, level in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append(np.zeros(0))
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self._compress()
+        return self
+    
+    @property
+    def std(self):
+        if self.count < 2:
+            return np.nan
+        return np.sqrt(self.m2 / (self.count - 1))
+    
+    def quantile(self, q):
+        """
+        approximate quantile q, interpolating linearly between items like
+        Series.quantile
+        """
+        if self.count == 0:
+            return np.nan
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items)
+        items = items[order]
+        weights = weights[order]
+        ranks = np.cumsum(weights) - (weights + 1) / 2.0
+        return np.interp(q * (weights.sum() - 1), ranks, items)
+
+
+def _box_stats(q1, q2, q3, mean, std):
+    d = pd.Series()
+    d['q1'] = q1
+    d['q2'] = q2
+    d['q3'] = q3
+    d['iq'] = d['q3']-d['q1']
+    d['lower_inner_fence'] = d['q1'] - 1.5 * d['iq']
+    d['upper_inner_fence'] = d['q3'] + 1.5 * d['iq']
+    d['lower_outer_fence'] = d['q1'] - 3 * d['iq']
+    d['upper_outer_fence'] = d['q3'] + 3 * d['iq']
+    d['upper_whisker'] = mean+3*std
+    d['lower_whisker'] = mean-3*std
+    return d
+
+
+@cached
+def boxplot_data(series, approximate = False, k = 200):
     """
     params:
         series: a pandas series
+        approximate: summarize with a QuantileSketch instead of exact
+                     quantiles, see sketch_boxplot_data
+        k: sketch size when approximate
     
     returns:
         d: series with values to produce boxplots
@@ -21,25 +162,59 @@ def boxplot_data(series):
     
     http://www.itl.nist.gov/div898/handbook/prc/section1/prc16.htm
     """
-    d = pd.Series()
+    if approximate:
+        return sketch_boxplot_data([series], k = k)
     s = series.dropna()
     #s = s[~((s-s.mean()).abs()>5*s.std())]
-    d['q1'] = s.quantile(.25)
-    d['q2'] = s.quantile(.5)
-    d['q3'] = s.quantile(.75)
-    d['iq'] = d['q3']-d['q1']
-    d['lower_inner_fence'] = d['q1'] - 1.5 * d['iq']
-    d['upper_inner_fence'] = d['q3'] + 1.5 * d['iq']
-    d['lower_outer_fence'] = d['q1'] - 3 * d['iq']
-    d['upper_outer_fence'] = d['q3'] + 3 * d['iq']
-    d['upper_whisker'] = series.mean()+3*series.std()
-    d['lower_whisker'] = series.mean()-3*series.std()
+    d = _box_stats(s.quantile(.25), s.quantile(.5), s.quantile(.75), series.mean(), series.std())
     outliers= s[(s>d['upper_outer_fence']) | (s<d['lower_outer_fence'])]
     return (d, outliers)
 
+
+def sketch_boxplot_data(chunks, sketch = None, k = 200, seed = None):
+    """
+    sketch_boxplot_data produces the boxplot values of boxplot_data from
+    data read in chunks, in bounded memory.  The first pass builds a 
+    QuantileSketch, quartiles and fences carry its error bound and the 
+    whiskers are exact.  A second pass collects the outliers beyond the 
+    outer fences.
+    
+    params:
+        chunks: an iterable of pandas series or arrays that can be 
+                iterated twice, e.g. a list of series or a reader that 
+                reopens its file
+        sketch: a QuantileSketch already built over chunks, for example
+                merged from workers, which skips the first pass
+        k: sketch size
+        seed: seed for the sketch
+    
+    returns:
+        d: series with values to produce boxplots
+        outliers: new series contianing the outliers, indexed by the 
+                  chunk index or by position for arrays
+    """
+    if sketch is None:
+        sketch = QuantileSketch(k = k, seed = seed)
+        for chunk in chunks:
+            sketch.update(chunk)
+    d = _box_stats(sketch.quantile(.25), sketch.quantile(.5), sketch.quantile(.75), 
+                   sketch.mean if sketch.count else np.nan, sketch.std)
+    outliers = []
+    offset = 0
+    for chunk in chunks:
+        if not isinstance(chunk, pd.Series):
+            chunk = pd.Series(np.asarray(chunk, dtype = float).ravel(), 
+                              index = pd.RangeIndex(offset, offset + len(chunk)))
+        offset += len(chunk)
+        outliers.append(chunk[(chunk>d['upper_outer_fence']) | (chunk<d['lower_outer_fence'])])
+    outliers = pd.concat(outliers) if outliers else pd.Series(dtype = float)
+    return (d, outliers)
+
 def box_data(df):
     """
-    box_data calculates boxplot values for each column in a pandas df
+    box_data calculates boxplot values for each column in a pandas df.
+    Values more than 5 standard deviations from the column mean are 
+    dropped first.  Every statistic is computed for all columns at once.
     
     params:
         df: pandas dataframe 
@@ -48,42 +223,82 @@ def box_data(df):
         ol: outliers for data
     
     """
-    melted = df.melt()
-    groups = melted.groupby(by = 'variable')
+    numeric = df.select_dtypes(include = 'number')
+    skipped = [column for column in df.columns if column not in numeric.columns]
+    if skipped:
+        warnings.warn('box_data skipped non-numeric columns: {}'.format(skipped))
+    numeric = numeric[sorted(numeric.columns)].reset_index(drop = True)
+    names = list(numeric.columns)
+    s = numeric.where(~((numeric - numeric.mean()).abs() > 5 * numeric.std()))
     
-    df = pd.DataFrame()
-    names = []
-    ol = []
-    for name, group in groups:
-        
-        s = pd.Series(pd.DataFrame(group.values).iloc[:,1])
-        
-        s = s[~((s-s.mean()).abs()>5*s.std())]
-        try:
-            
-            d,outliers = boxplot_data(s)
-            ol_df = pd.DataFrame({'outliers':outliers})
-            ol_df['variable'] = name
-            ol.append(ol_df)
-            df = df.append(d, ignore_index = True)
-            names.append(name)
-        except:
-            print(name)
-            continue
-    df['variable'] = names
-    
-    #df['date'] = pd.to_datetime(df['date'])
-    ol = pd.concat(ol)
-    #ol['date'] = pd.to_datetime(ol['date'])
-    return (df, ol)
+    quantiles = s.quantile([.25, .5, .75])
+    stats = pd.DataFrame({'q1': quantiles.iloc[0], 'q2': quantiles.iloc[1], 'q3': quantiles.iloc[2]})
+    stats['iq'] = stats['q3'] - stats['q1']
+    stats['lower_inner_fence'] = stats['q1'] - 1.5 * stats['iq']
+    stats['upper_inner_fence'] = stats['q3'] + 1.5 * stats['iq']
+    stats['lower_outer_fence'] = stats['q1'] - 3 * stats['iq']
+    stats['upper_outer_fence'] = stats['q3'] + 3 * stats['iq']
+    mean = s.mean()
+    std = s.std()
+    stats['upper_whisker'] = mean + 3 * std
+    stats['lower_whisker'] = mean - 3 * std
+    stats = stats.reset_index(drop = True)
+    stats['variable'] = names
+    
+    values = s.values
+    outside = (values > stats['upper_outer_fence'].values) | (values < stats['lower_outer_fence'].values)
+    cols, rows = np.nonzero(outside.T)
+    ol = pd.DataFrame({'outliers': values[rows, cols], 
+                       'variable': np.asarray(names, dtype = object)[cols]}, index = rows)
+    return (stats, ol)
 
 
 
 
+def _lerp(a, b, t):
+    """
+    linear interpolation between a and b, arranged as numpy's quantile 
+    does so grouped quantiles match Series.quantile exactly
+    """
+    diff = b - a
+    return np.where(t >= .5, b - diff * (1 - t), a + diff * t)
+
+
+def _grouped_quantiles(values, codes, ngroups, qs):
+    """
+    linear quantiles of values within each group, from one sort of the
+    whole array and a lookup at every group's boundaries
+    
+    params:
+        values: 1-d float array without missing values
+        codes: group number of each value, 0 to ngroups - 1
+        ngroups: number of groups
+        qs: quantiles to compute
+    
+    returns:
+        out: (ngroups, len(qs)) array, NaN for empty groups
+    """
+    v = values[np.lexsort((values, codes))]
+    counts = np.bincount(codes, minlength = ngroups)
+    starts = np.cumsum(counts) - counts
+    out = np.full((ngroups, len(qs)), np.nan)
+    has = counts > 0
+    n = counts[has]
+    start = starts[has]
+    for i, q in enumerate(qs):
+        pos = q * (n - 1)
+        lo = np.floor(pos).astype(int)
+        hi = np.minimum(lo + 1, n - 1)
+        out[has, i] = _lerp(v[start + lo], v[start + hi], pos - lo)
+    return out
+
+
 def ts_box_data(series, freq = 'A'):
     """
     ts_box_data groups data into a specified frequency and returns a
-    dataframe of boxplot data for each group
+    dataframe of boxplot data for each group.  Values more than 4 
+    standard deviations from their group mean are dropped first.  All
+    groups are computed together from one sort of the data.
     
     params:
         series: a time series
@@ -92,64 +307,84 @@ def ts_box_data(series, freq = 'A'):
         http://pandas.pydata.org/pandas-docs/stable/timeseries.html#offset-aliases
         
     returns:
-        df: a dataframe of grouped boxplot data
+        df: a dataframe of grouped boxplot data, the error column names 
+            groups that could not be summarized
         ol: a dataframe of the outliers for each group
         
     """
-
+    # the group numbers come back in time order, so line the values up 
+    # with them by sorting the series the same way first
+    series = series.sort_index(kind = 'stable')
     groups = series.groupby(pd.Grouper(freq = freq))
-    df = pd.DataFrame()
-    names = []
-    ol = []
-    for name, group in groups:
-#        name_dict = {
-#                    'year':name.year,
-#                    'month': name.month,
-#                    'week': name.week
-#                     }
-        try:
-            s = pd.Series(group.values)
-            s = s[~((s-s.mean()).abs()>4*s.std())]
-            d,outliers = boxplot_data(s)
-            ol_df = pd.DataFrame({'outliers':outliers})
-            ol_df['date'] = name
-            ol.append(ol_df)
-            df = df.append(d, ignore_index = True)
-            names.append(name)
-        except:
-            print(name)
-            continue
+    names = groups.size().index
+    ngroups = len(names)
+    codes = groups.ngroup().values
+    values = np.asarray(series, dtype = float)
+    
+    grouped = pd.Series(values).groupby(codes)
+    mean = grouped.transform('mean').values
+    std = grouped.transform('std').values
+    keep = ~(np.abs(values - mean) > 4 * std) & ~np.isnan(values)
+    values = values[keep]
+    codes = codes[keep]
+    
+    quantiles = _grouped_quantiles(values, codes, ngroups, [.25, .5, .75])
+    df = pd.DataFrame(quantiles, columns = ['q1', 'q2', 'q3'])
+    df['iq'] = df['q3'] - df['q1']
+    df['lower_inner_fence'] = df['q1'] - 1.5 * df['iq']
+    df['upper_inner_fence'] = df['q3'] + 1.5 * df['iq']
+    df['lower_outer_fence'] = df['q1'] - 3 * df['iq']
+    df['upper_outer_fence'] = df['q3'] + 3 * df['iq']
+    moments = pd.Series(values).groupby(codes).agg(['mean', 'std']).reindex(range(ngroups))
+    df['upper_whisker'] = (moments['mean'] + 3 * moments['std']).values
+    df['lower_whisker'] = (moments['mean'] - 3 * moments['std']).values
+    df['error'] = np.where(np.bincount(codes, minlength = ngroups) == 0, 'no data', None)
     df['date'] = names
     df.set_index('date', inplace = True)
-    #df['date'] = pd.to_datetime(df['date'])
-    ol = pd.concat(ol)
+    
+    outside = (values > df['upper_outer_fence'].values[codes]) | (values < df['lower_outer_fence'].values[codes])
+    ol = pd.DataFrame({'outliers': values[outside], 'date': names[codes[outside]]})
     ol.set_index('date', inplace = True)
-    #ol['date'] = pd.to_datetime(ol['date'])
     return (df, ol)
 
 
 
 
 def box_plot(x_col_name, df, outliers = False, title='',theme = False):
-    x = [str(x) for x in df[x_col_name]]
-    TOOLS = "pan,wheel_zoom,box_zoom,reset,save"
-    
-    p = figure(x_range=x, tools=TOOLS, title = title)    
-    p.xaxis.major_label_orientation = pi/4
-    #whiskers
-    p.segment(x, df['upper_whisker'], x,df['lower_whisker'], color="black")
-    #box
-    p.vbar(x = x, width = .5, bottom = df['q1'], top = df['q3'], fill_color=colors[:len(df)], line_color="black")
-    #median
-    p.vbar(x = x, width = .5, bottom = df['q2']-.01, top = df['q2']+.01, fill_color="black", line_color="black")
-    #outliers
-    if not outliers.empty:
+    from bokeh.plotting import figure
+    from bokeh.palettes import all_palettes
+    from bokeh.io import curdoc
+    from bokeh.models import ColumnDataSource
+    colors = all_palettes['Colorblind'][8]
+    with stage('box_plot', 'figure', rows = len(df)):
+        x = [str(x) for x in df[x_col_name]]
+        TOOLS = "pan,wheel_zoom,box_zoom,reset,save"
+        # one source for every glyph, so x and the quantiles are sent once
+        source = ColumnDataSource(data = {'x': x,
+                                          'upper_whisker': df['upper_whisker'].values,
+                                          'lower_whisker': df['lower_whisker'].values,
+                                          'q1': df['q1'].values,
+                                          'q3': df['q3'].values,
+                                          'median_bottom': df['q2'].values - .01,
+                                          'median_top': df['q2'].values + .01,
+                                          'color': [colors[i % len(colors)] for i in range(len(df))]})
+    
+        p = figure(x_range=x, tools=TOOLS, title = title)    
+        p.xaxis.major_label_orientation = pi/4
+        #whiskers
+        p.segment('x', 'upper_whisker', 'x', 'lower_whisker', source = source, color="black")
+        #box
+        p.vbar(x = 'x', width = .5, bottom = 'q1', top = 'q3', source = source, fill_color='color', line_color="black")
+        #median
+        p.vbar(x = 'x', width = .5, bottom = 'median_bottom', top = 'median_top', source = source, fill_color="black", line_color="black")
+        #outliers
+        if not outliers.empty:
         
-        p.circle(x = outliers.index, y = outliers.values[0], size=5, color=colors[1])
+            p.circle(x = [str(x) for x in outliers.index], y = np.asarray(outliers, dtype = float).ravel(), size=5, color=colors[1])
     
-    if theme:
-        doc = curdoc()
-        doc.theme = theme
-        doc.add_root(p)   
+        if theme:
+            doc = curdoc()
+            doc.theme = theme
+            doc.add_root(p)   
     
     return p
\ No newline at end of file
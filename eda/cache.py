@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed cache for computed statistics.
+
+    from eda.cache import StatCache, set_cache
+
+    set_cache(StatCache(max_bytes = 512 * 2**20, directory = '~/.cache/eda'))
+
+Once a cache is set, acf, boxplot_data, decompose and get_best_poly look
+their result up by a hash of the input data, its index and the
+parameters before computing it, so rendering the same series again skips
+the statistics.  Results are kept in memory up to max_bytes, least
+recently used first out, and with a directory also pickled to disk up to
+max_disk_bytes.
+"""
+
+import os
+import sys
+import glob
+import pickle
+import hashlib
+import inspect
+import functools
+from copy import deepcopy
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+
+_cache = None
+
+
+class _Unhashable(Exception):
+    pass
+
+
+def _update_hash(h, value):
+    """
+    feeds value into the hash h, raising _Unhashable for values without a
+    stable content, e.g. random generators or functions
+    """
+    if isinstance(value, (pd.Series, pd.DataFrame, pd.Index)):
+        h.update(type(value).__name__.encode())
+        if isinstance(value, pd.DataFrame):
+            h.update(repr((list(value.columns), [str(d) for d in value.dtypes])).encode())
+        else:
+            h.update(repr((value.name, str(value.dtype))).encode())
+        h.update(pd.util.hash_pandas_object(value, index = not isinstance(value, pd.Index)).values.tobytes())
+    elif isinstance(value, np.ndarray):
+        h.update(repr((value.dtype.str, value.shape)).encode())
+        if value.dtype == object:
+            h.update(pd.util.hash_array(value.ravel()).tobytes())
+        else:
+            h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        h.update(repr((type(value).__name__, len(value))).encode())
+        for item in value:
+            _update_hash(h, item)
+    elif isinstance(value, dict):
+        h.update(repr(('dict', sorted(value))).encode())
+        for name in sorted(value):
+            _update_hash(h, value[name])
+    elif value is None or isinstance(value, (bool, int, float, str, np.number)):
+        h.update(repr((type(value).__name__, value)).encode())
+    else:
+        raise _Unhashable(type(value).__name__)
+
+
+def cache_key(function, args, kwargs):
+    """
+    cache_key hashes a call of function: its name and every bound
+    argument, defaults included, so f(x, 3) and f(x, lag = 3) share a key
+
+    returns:
+        key: hex digest, None if an argument has no stable content
+    """
+    bound = inspect.signature(function).bind(*args, **kwargs)
+    bound.apply_defaults()
+    h = hashlib.blake2b(digest_size = 20)
+    h.update('{}.{}'.format(function.__module__, function.__qualname__).encode())
+    try:
+        for name, value in bound.arguments.items():
+            h.update(name.encode())
+            _update_hash(h, value)
+    except _Unhashable:
+        return None
+    return h.hexdigest()
+
+
+def _nbytes(value):
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        return int(np.sum(value.memory_usage(deep = True)))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class StatCache:
+    """
+    StatCache holds results in a least recently used in-memory tier and,
+    with a directory, an on-disk tier of pickle files.  A result evicted
+    from memory stays on disk and is promoted back on its next hit.
+
+    params:
+        max_bytes: in-memory budget
+        directory: directory for the on-disk tier, None keeps results in
+                   memory only
+        max_disk_bytes: on-disk budget, the least recently used files
+                        are removed beyond it
+
+    attributes:
+        hits, disk_hits, misses: lookup counters, see stats
+
+    """
+
+    def __init__(self, max_bytes = 256 * 2**20, directory = None, max_disk_bytes = 2**30):
+        self.max_bytes = max_bytes
+        self.directory = None if directory is None else os.path.expanduser(directory)
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok = True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def _remember(self, key, value, nbytes):
+        if nbytes > self.max_bytes:
+            return
+        self.entries[key] = (value, nbytes)
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last = False)
+            self.nbytes -= evicted
+
+    def get(self, key):
+        """
+        returns:
+            found: whether key is cached
+            value: a copy of the cached result, None when not found
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, deepcopy(self.entries[key][0])
+        if self.directory is not None and os.path.exists(self._path(key)):
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as f:
+                    value = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                self.misses += 1
+                return False, None
+            os.utime(path)
+            self.disk_hits += 1
+            self._remember(key, value, _nbytes(value))
+            return True, deepcopy(value)
+        self.misses += 1
+        return False, None
+
+    def put(self, key, value):
+        if key in self.entries:
+            self.nbytes -= self.entries.pop(key)[1]
+        value = deepcopy(value)
+        self._remember(key, value, _nbytes(value))
+        if self.directory is not None:
+            path = self._path(key)
+            with open(path + '.tmp', 'wb') as f:
+                pickle.dump(value, f, protocol = pickle.HIGHEST_PROTOCOL)
+            os.replace(path + '.tmp', path)
+            self._evict_disk()
+
+    def _evict_disk(self):
+        files = [(os.path.getmtime(path), os.path.getsize(path), path)
+                 for path in glob.glob(os.path.join(self.directory, '*.pkl'))]
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self, disk = False):
+        """
+        empties the memory tier, and the disk tier when disk is True
+        """
+        self.entries.clear()
+        self.nbytes = 0
+        if disk and self.directory is not None:
+            for path in glob.glob(os.path.join(self.directory, '*.pkl')):
+                os.remove(path)
+
+    def stats(self):
+        """
+        returns:
+            stats: pandas series of the counters, the hit rate and the
+                   memory in use
+        """
+        lookups = self.hits + self.disk_hits + self.misses
+        return pd.Series({'hits': self.hits,
+                          'disk_hits': self.disk_hits,
+                          'misses': self.misses,
+                          'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else np.nan,
+                          'entries': len(self.entries),
+                          'bytes': self.nbytes})
+
+
+def set_cache(cache):
+    """
+    set_cache makes cache the one used by the cached functions, None turns
+    caching off
+
+    returns:
+        previous: the cache set before
+    """
+    global _cache
+    previous = _cache
+    _cache = cache
+    return previous
+
+
+def get_cache():
+    return _cache
+
+
+def cached(function):
+    """
+    cached looks calls of function up in the cache set with set_cache.
+    Calls with arguments that have no stable content, like a numpy
+    Generator or a backend function, are always computed.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        cache = _cache
+        if cache is None:
+            return function(*args, **kwargs)
+        key = cache_key(function, args, kwargs)
+        if key is None:
+            return function(*args, **kwargs)
+        found, value = cache.get(key)
+        if found:
+            return value
+        value = function(*args, **kwargs)
+        cache.put(key, value)
+        return value
+    return wrapper
@@ -1,13 +1,162 @@
 # -*- coding: utf-8 -*-
 
 
-from bokeh.plotting import figure
-from bokeh.io import curdoc
-from bokeh.models import Legend
-from eda.boxplot import boxplot_data
+import numpy as np
+import pandas as pd
+from eda.downsample import downsample, resample_on_zoom, _in_server
+from eda.profiling import stage
 
 
-def control_plot(series, theme = False, title = '', x_axis_type = 'datetime', **kwargs):
+def control_limits(series):
+    """
+    control_limits computes the center line and the 1, 2 and 3 standard 
+    deviation limits of a control chart, reading the data once for the
+    mean and once for the standard deviation
+    
+    params:
+        series: a time series
+    
+    returns:
+        limits: series with mean, std, upper_1..3 and lower_1..3
+    """
+    values = np.asarray(series, dtype = float)
+    mean = np.nanmean(values)
+    std = np.nanstd(values, ddof = 1)
+    limits = pd.Series({'mean': mean, 'std': std})
+    for k in (1, 2, 3):
+        limits['upper_{}'.format(k)] = mean + k * std
+        limits['lower_{}'.format(k)] = mean - k * std
+    return limits
+
+
+def _limit_lines(p, x, limits, line_width = 2):
+    """
+    draws the control limits as two point lines spanning x, so the 
+    document holds two values per limit instead of a copy of x
+    
+    returns:
+        s3, s2, s1, m: the renderers for the legend
+    """
+    x = [x.min(), x.max()] if len(x) else []
+    def line(value, **kwargs):
+        return p.line(x, [value] * len(x), line_width = line_width, **kwargs)
+    s3 = line(limits['upper_3'], line_color = 'red')
+    s2 = line(limits['upper_2'], line_color = 'grey')
+    s1 = line(limits['upper_1'], line_dash='dashed', line_color='grey')
+    m = line(limits['mean'], line_color='black')
+    line(limits['lower_1'], line_dash='dashed', line_color='grey')
+    line(limits['lower_2'], line_color = 'grey')
+    line(limits['lower_3'], line_color = 'red')
+    return s3, s2, s1, m
+
+
+def _run_length(mask):
+    """
+    length of the run of True values ending at each position of mask
+    """
+    c = np.cumsum(mask)
+    return c - np.maximum.accumulate(np.where(mask, 0, c))
+
+
+def _window_count(mask, w):
+    """
+    number of True values in the w points ending at each position of 
+    mask, 0 where fewer than w points are available
+    """
+    c = np.concatenate([[0], np.cumsum(mask)])
+    counts = np.zeros(len(mask), dtype = int)
+    counts[w - 1:] = c[w:] - c[:-w]
+    return counts
+
+
+def _shifted(mask, k = 1):
+    """
+    mask of differences moved onto the point that ends them
+    """
+    return np.concatenate([np.zeros(k, dtype = bool), mask])
+
+
+_rule_sets = {
+    'western_electric': ['we_1', 'we_2', 'we_3', 'we_4'],
+    'nelson': ['nelson_{}'.format(i) for i in range(1, 9)],
+}
+
+
+def control_rules(series, rules = 'nelson', limits = None):
+    """
+    control_rules finds the points that break the Western Electric or 
+    Nelson rules, using the same mean and standard deviation as 
+    control_plot.  Every rule is a vectorized run length or rolling 
+    window count, and a point is reported where the run or window that 
+    breaks the rule ends.
+    
+    Western Electric
+        we_1: one point beyond 3 standard deviations
+        we_2: two out of three points beyond 2 standard deviations, same side
+        we_3: four out of five points beyond 1 standard deviation, same side
+        we_4: eight points in a row on the same side of the mean
+    Nelson
+        nelson_1: one point beyond 3 standard deviations
+        nelson_2: nine points in a row on the same side of the mean
+        nelson_3: six points in a row steadily increasing or decreasing
+        nelson_4: fourteen points in a row alternating up and down
+        nelson_5: two out of three points beyond 2 standard deviations, same side
+        nelson_6: four out of five points beyond 1 standard deviation, same side
+        nelson_7: fifteen points in a row within 1 standard deviation
+        nelson_8: eight points in a row beyond 1 standard deviation, with 
+                  points on both sides of the mean
+    
+    params:
+        series: a time series
+        rules: 'western_electric', 'nelson', a rule name or a list of them
+        limits: output of control_limits, computed from series if None
+    
+    returns:
+        violations: dataframe with the index of each violating point and 
+                    the rule it breaks, in time order
+    """
+    if limits is None:
+        limits = control_limits(series)
+    if isinstance(rules, str):
+        names = _rule_sets[rules] if rules in _rule_sets else [rules]
+    else:
+        names = rules
+    z = (np.asarray(series, dtype = float) - limits['mean']) / limits['std']
+    d = np.diff(z)
+    up = _shifted(d > 0)
+    down = _shifted(d < 0)
+    alternating = _shifted(d[1:] * d[:-1] < 0, 2)
+    tests = {
+        'we_1': lambda: np.abs(z) > 3,
+        'we_2': lambda: (_window_count(z > 2, 3) >= 2) | (_window_count(z < -2, 3) >= 2),
+        'we_3': lambda: (_window_count(z > 1, 5) >= 4) | (_window_count(z < -1, 5) >= 4),
+        'we_4': lambda: (_run_length(z > 0) >= 8) | (_run_length(z < 0) >= 8),
+        'nelson_1': lambda: np.abs(z) > 3,
+        'nelson_2': lambda: (_run_length(z > 0) >= 9) | (_run_length(z < 0) >= 9),
+        'nelson_3': lambda: (_run_length(up) >= 5) | (_run_length(down) >= 5),
+        'nelson_4': lambda: _run_length(alternating) >= 12,
+        'nelson_5': lambda: (_window_count(z > 2, 3) >= 2) | (_window_count(z < -2, 3) >= 2),
+        'nelson_6': lambda: (_window_count(z > 1, 5) >= 4) | (_window_count(z < -1, 5) >= 4),
+        'nelson_7': lambda: _run_length(np.abs(z) < 1) >= 15,
+        'nelson_8': lambda: ((_run_length(np.abs(z) > 1) >= 8) & (_window_count(z > 1, 8) > 0) 
+                             & (_window_count(z < -1, 8) > 0)),
+    }
+    positions = []
+    labels = []
+    for name in names:
+        if name not in tests:
+            raise ValueError('unknown control rule: {}'.format(name))
+        hits = np.nonzero(tests[name]())[0]
+        positions.append(hits)
+        labels.append(np.full(len(hits), name, dtype = object))
+    positions = np.concatenate(positions) if positions else np.zeros(0, dtype = int)
+    labels = np.concatenate(labels) if labels else np.zeros(0, dtype = object)
+    order = np.argsort(positions, kind = 'stable')
+    violations = pd.DataFrame({'index': series.index[positions[order]], 'rule': labels[order]})
+    return violations
+
+
+def control_plot(series, theme = False, title = '', x_axis_type = 'datetime', rules = None, max_points = None, method = 'minmax', **kwargs):
     """
     The control chart is a graph used to study how a process changes over time. 
     Data are plotted in time order. A control chart always has a central line for 
@@ -27,35 +176,219 @@ def control_plot(series, theme = False, title = '', x_axis_type = 'datetime', **
     
     
     source: http://asq.org/learn-about-quality/data-collection-analysis-tools/overview/control-chart.html
+    
+    rules: 'western_electric', 'nelson', a rule name or a list of them to mark
+           the violating points, see control_rules
+    
+    max_points: draw the series with about this many points, decimated 
+                with method, see eda.downsample.downsample.  Limits and
+                rule violations are still computed from every point.
     """
     
     
     
-    p = figure(title = title, x_axis_type=x_axis_type, **kwargs)
+    from bokeh.plotting import figure
+    from bokeh.io import curdoc
+    from bokeh.models import Legend
     x = series.index
     y = series.values
-    quantiles,outliers = boxplot_data(series)
-    s3 = p.line(x, series.mean()+3*series.std(), line_color = 'red', line_width = 2)
-    s2 = p.line(x, series.mean()+2*series.std(), line_color = 'grey', line_width = 2)
-    s1 = p.line(x, series.mean()+series.std(), line_dash='dashed', line_color='grey', line_width = 2)
-    m = p.line(x, series.mean(), line_color='black', line_width = 2)
-    p.line(x, series.mean()-series.std(), line_dash='dashed', line_color='grey', line_width = 2)
-    p.line(x, series.mean()-2*series.std(), line_color = 'grey', line_width = 2)
-    p.line(x, series.mean()-3*series.std(), line_color = 'red', line_width = 2)
-    p.line(x, y, line_width = 3)
-    legend = Legend(items=[
-    ('3 standard deviations' , [s3]),
-    ('2 standard deviations' , [s2]),
-    ('1 standard deviations' , [s1]),
-    ("Mean" , [m])], location=(0, 0))
-    
-    p.add_layout(legend, 'below')
-    p.legend.orientation = "horizontal"
-    if theme:
-        doc = curdoc()
-        doc.theme = theme
-        doc.add_root(p)
+    with stage('control_plot', 'compute', rows = len(series)):
+        limits = control_limits(series)
+        line_x, line_y = downsample(x, y, max_points, method)
+        if rules is not None:
+            violations = control_rules(series, rules = rules, limits = limits)
+            flagged = series.loc[violations['index'].drop_duplicates()]
+    with stage('control_plot', 'figure', rows = len(line_y)):
+        p = figure(title = title, x_axis_type=x_axis_type, **kwargs)
+        s3, s2, s1, m = _limit_lines(p, x, limits)
+        line = p.line(line_x, line_y, line_width = 3)
+        if max_points is not None and _in_server():
+            resample_on_zoom(p, line, x, y, max_points, method)
+        items = [
+        ('3 standard deviations' , [s3]),
+        ('2 standard deviations' , [s2]),
+        ('1 standard deviations' , [s1]),
+        ("Mean" , [m])]
+        if rules is not None:
+            v = p.circle(flagged.index, flagged.values, size = 8, color = 'red')
+            items.append(('Rule violations', [v]))
+        legend = Legend(items=items, location=(0, 0))
+        
+        p.add_layout(legend, 'below')
+        p.legend.orientation = "horizontal"
+        if theme:
+            doc = curdoc()
+            doc.theme = theme
+            doc.add_root(p)
     
     return p 
 
 
+
+
+class OnlineControlChart:
+    """
+    OnlineControlChart updates Shewhart, EWMA and CUSUM statistics one 
+    point at a time, in O(1) per point, for live series.  The center 
+    line and standard deviation come from the running moments of every
+    point seen, or of the last window points, unless a target mean and
+    std (e.g. from control_limits over in-control history) are given.
+    Each update appends a row to a ColumnDataSource, and figures built 
+    with figure or cusum_figure redraw from that source through 
+    ColumnDataSource.stream, so a live document is never rebuilt.
+    
+    params:
+        window: number of points in the rolling moments, None for all
+        lam: EWMA smoothing weight, between 0 and 1
+        L: width of the EWMA limits in standard deviations
+        k: CUSUM allowance in standard deviations
+        h: CUSUM decision interval in standard deviations
+        mean: target center line, defaults to the running mean
+        std: target standard deviation, defaults to the running std
+        rollover: number of rows kept in the data source, None for all
+    
+    usage:
+        chart = OnlineControlChart(window = 1000)
+        p = chart.figure()
+        chart.push(series)           # history, or new points as they arrive
+    
+    """
+    
+    columns = ['x', 'y', 'mean', 'upper_3', 'lower_3', 'ewma', 'ewma_upper', 
+               'ewma_lower', 'cusum_upper', 'cusum_lower', 'cusum_limit']
+    
+    def __init__(self, window = None, lam = .2, L = 3, k = .5, h = 5, mean = None, std = None, rollover = None):
+        self.window = window
+        self.lam = lam
+        self.L = L
+        self.k = k
+        self.h = h
+        self.target_mean = mean
+        self.target_std = std
+        self.rollover = rollover
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.buffer = np.zeros(window) if window else None
+        self.t = 0
+        self.ewma = None
+        self.cusum_upper = 0.0
+        self.cusum_lower = 0.0
+        from bokeh.models import ColumnDataSource
+        self.source = ColumnDataSource(data = {column: [] for column in self.columns})
+    
+    def _add(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+    
+    def _remove(self, value):
+        self.n -= 1
+        if self.n == 0:
+            self.mean = 0.0
+            self.m2 = 0.0
+            return
+        delta = value - self.mean
+        self.mean -= delta / self.n
+        self.m2 -= delta * (value - self.mean)
+    
+    def update(self, x, value):
+        """
+        add one observation
+        
+        params:
+            x: its index value, e.g. a timestamp
+            value: the observation
+        
+        returns:
+            row: dict of the chart statistics at this point
+        """
+        value = float(value)
+        if self.window:
+            slot = self.t % self.window
+            if self.t >= self.window:
+                self._remove(self.buffer[slot])
+            self.buffer[slot] = value
+        self._add(value)
+        self.t += 1
+        
+        mean = self.mean if self.target_mean is None else self.target_mean
+        if self.target_std is not None:
+            std = self.target_std
+        else:
+            std = np.sqrt(max(self.m2, 0) / (self.n - 1)) if self.n > 1 else 0.0
+        
+        lam = self.lam
+        self.ewma = mean if self.ewma is None else self.ewma
+        self.ewma = lam * value + (1 - lam) * self.ewma
+        ewma_width = self.L * std * np.sqrt(lam / (2 - lam) * (1 - (1 - lam) ** (2 * self.t)))
+        self.cusum_upper = max(0.0, self.cusum_upper + value - mean - self.k * std)
+        self.cusum_lower = max(0.0, self.cusum_lower + mean - self.k * std - value)
+        return {'x': x, 'y': value, 'mean': mean, 
+                'upper_3': mean + 3 * std, 'lower_3': mean - 3 * std,
+                'ewma': self.ewma, 'ewma_upper': mean + ewma_width, 'ewma_lower': mean - ewma_width,
+                'cusum_upper': self.cusum_upper, 'cusum_lower': self.cusum_lower, 
+                'cusum_limit': self.h * std}
+    
+    def push(self, series):
+        """
+        add a batch of observations and stream the new rows into the 
+        data source, so open figures update in place
+        
+        params:
+            series: a pandas series of new points in time order
+        
+        returns:
+            rows: dataframe of the chart statistics for the new points
+        """
+        rows = [self.update(x, value) for x, value in zip(series.index, series.values)]
+        data = {column: [row[column] for row in rows] for column in self.columns}
+        if rows:
+            self.source.stream(data, rollover = self.rollover)
+        return pd.DataFrame(data, columns = self.columns)
+    
+    def figure(self, title = '', x_axis_type = 'datetime', **kwargs):
+        """
+        returns:
+            p: a bokeh figure of the series with its running mean, 3 sigma 
+               limits, EWMA and EWMA limits, drawn from the data source
+        """
+        from bokeh.plotting import figure
+        from bokeh.models import Legend
+        p = figure(title = title, x_axis_type=x_axis_type, **kwargs)
+        p.line('x', 'y', source = self.source, line_width = 3)
+        s3 = p.line('x', 'upper_3', source = self.source, line_color = 'red', line_width = 2)
+        p.line('x', 'lower_3', source = self.source, line_color = 'red', line_width = 2)
+        m = p.line('x', 'mean', source = self.source, line_color = 'black', line_width = 2)
+        e = p.line('x', 'ewma', source = self.source, line_color = 'orange', line_width = 2)
+        el = p.line('x', 'ewma_upper', source = self.source, line_dash='dashed', line_color = 'orange', line_width = 2)
+        p.line('x', 'ewma_lower', source = self.source, line_dash='dashed', line_color = 'orange', line_width = 2)
+        legend = Legend(items=[
+        ('3 standard deviations' , [s3]),
+        ("Mean" , [m]),
+        ('EWMA' , [e]),
+        ('EWMA limits' , [el])], location=(0, 0))
+        p.add_layout(legend, 'below')
+        p.legend.orientation = "horizontal"
+        return p
+    
+    def cusum_figure(self, title = '', x_axis_type = 'datetime', **kwargs):
+        """
+        returns:
+            p: a bokeh figure of the upper and lower CUSUM against the 
+               decision interval, drawn from the data source
+        """
+        from bokeh.plotting import figure
+        from bokeh.models import Legend
+        p = figure(title = title, x_axis_type=x_axis_type, **kwargs)
+        u = p.line('x', 'cusum_upper', source = self.source, line_width = 2)
+        l = p.line('x', 'cusum_lower', source = self.source, line_color = 'grey', line_width = 2)
+        h = p.line('x', 'cusum_limit', source = self.source, line_color = 'red', line_width = 2)
+        legend = Legend(items=[
+        ('Upper CUSUM' , [u]),
+        ('Lower CUSUM' , [l]),
+        ('Decision interval' , [h])], location=(0, 0))
+        p.add_layout(legend, 'below')
+        p.legend.orientation = "horizontal"
+        return p
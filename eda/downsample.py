@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+
+def _utc(x):
+    """
+    datetimes, timezone aware or not, as naive UTC datetime64
+    """
+    return pd.DatetimeIndex(pd.to_datetime(x, utc = True)).tz_localize(None).values
+
+
+def _numeric(x):
+    """
+    x as a float array, datetimes as milliseconds since epoch like bokeh,
+    timezone aware ones converted to UTC first
+    """
+    if isinstance(x, (pd.Series, pd.Index)) and pd.api.types.is_datetime64_any_dtype(x):
+        x = _utc(x)
+    x = np.asarray(x)
+    if x.dtype == object and pd.api.types.infer_dtype(x, skipna = True) == 'datetime':
+        x = _utc(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype('int64') / 1e6
+    return x.astype(float)
+
+
+def _take(a, idx):
+    if isinstance(a, (list, tuple)):
+        return np.asarray(a)[idx]
+    return a.take(idx)
+
+
+def minmax_index(y, max_points):
+    """
+    minmax_index splits y into max_points / 2 buckets of equal length and
+    keeps the minimum and the maximum of each, plus the first and last
+    point, so every spike and extreme survives
+
+    params:
+        y: array of values
+        max_points: number of points to keep, about
+
+    returns:
+        idx: sorted positions of the points to keep
+    """
+    y = np.asarray(y, dtype = float)
+    n = len(y)
+    buckets = max(1, (max_points - 2) // 2)
+    if n <= max_points:
+        return np.arange(n)
+    size = int(np.ceil(n / float(buckets)))
+    padded = np.full(size * buckets, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    nan = np.isnan(padded)
+    offsets = np.arange(buckets) * size
+    low = np.argmin(np.where(nan, np.inf, padded), axis = 1) + offsets
+    high = np.argmax(np.where(nan, -np.inf, padded), axis = 1) + offsets
+    idx = np.unique(np.concatenate([[0, n - 1], low, high]))
+    return idx[idx < n]
+
+
+def lttb_index(x, y, max_points):
+    """
+    lttb_index selects points with Largest-Triangle-Three-Buckets
+    (Steinarsson 2013): one point per bucket, the one forming the
+    largest triangle with the point kept in the previous bucket and the
+    mean of the next bucket
+
+    params:
+        x: index values, numbers or datetimes
+        y: array of values
+        max_points: number of points to keep, at least 3
+
+    returns:
+        idx: sorted positions of the points to keep
+    """
+    if max_points < 3:
+        raise ValueError('lttb keeps the first and last points and needs max_points of at least 3')
+    x = _numeric(x)
+    y = np.asarray(y, dtype = float)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    every = (n - 2) / float(max_points - 2)
+    idx = np.zeros(max_points, dtype = int)
+    idx[-1] = n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start = int(np.floor(i * every)) + 1
+        end = int(np.floor((i + 1) * every)) + 1
+        next_end = min(int(np.floor((i + 2) * every)) + 1, n)
+        nx = np.nanmean(x[end:next_end])
+        ny = np.nanmean(y[end:next_end])
+        area = np.abs((x[a] - nx) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (ny - y[a]))
+        a = start + int(np.argmax(np.where(np.isnan(area), -1, area)))
+        idx[i + 1] = a
+    return np.unique(idx)
+
+
+def downsample(x, y, max_points, method = 'minmax'):
+    """
+    downsample reduces a line to about max_points points before it is
+    drawn, so long series stay light in the browser
+
+    params:
+        x: index values
+        y: values
+        max_points: number of points to keep, None keeps every point
+        method: 'minmax' keeps each bucket's minimum and maximum and
+                preserves every extreme, 'lttb' keeps the visually most
+                significant point per bucket
+
+    returns:
+        x, y: the kept points, with the types of the inputs
+    """
+    if max_points is None or len(y) <= max_points:
+        return x, y
+    if method == 'minmax':
+        idx = minmax_index(y, max_points)
+    elif method == 'lttb':
+        idx = lttb_index(x, y, max_points)
+    else:
+        raise ValueError("method must be 'minmax' or 'lttb'")
+    return _take(x, idx), _take(y, idx)
+
+
+def resample_on_zoom(p, renderer, x, y, max_points, method = 'minmax'):
+    """
+    resample_on_zoom re-decimates renderer from the full x and y whenever
+    the x range of p changes, so zooming in shows the detail again.  The
+    callbacks run only in a bokeh server document and x must be sorted.
+
+    params:
+        p: the bokeh figure
+        renderer: the line renderer returned by p.line
+        x, y: the full data
+        max_points: number of points to draw for the visible range
+        method: see downsample
+    """
+    if isinstance(x, pd.Series):
+        x = pd.Index(x)
+    xs = _numeric(x)
+    values = np.asarray(y)
+    full_x = x if isinstance(x, pd.Index) else np.asarray(x)
+
+    def update(attr, old, new):
+        start, end = p.x_range.start, p.x_range.end
+        if start is None or end is None:
+            return
+        if not isinstance(start, (int, float)):
+            start, end = _numeric([start, end])
+        lo = max(0, np.searchsorted(xs, start) - 1)
+        hi = min(len(xs), np.searchsorted(xs, end) + 1)
+        sx, sy = downsample(full_x[lo:hi], values[lo:hi], max_points, method)
+        renderer.data_source.data = {'x': sx, 'y': sy}
+
+    p.x_range.on_change('start', update)
+    p.x_range.on_change('end', update)
+
+
+def _in_server():
+    from bokeh.io import curdoc
+    return curdoc().session_context is not None
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+import os
+import numpy as np
+import pandas as pd
+from eda.autocorrelation import OnlineACF
+from eda.boxplot import QuantileSketch, _box_stats
+
+
+class ChunkReader:
+    """
+    ChunkReader yields a file or an iterator in chunks, and can be
+    iterated more than once (each pass reopens the file), so it can be
+    handed to functions that need a second pass such as
+    sketch_boxplot_data.
+
+    params:
+        source: path to a .csv or .parquet file, an iterable of arrays or
+                series, or a function returning a fresh iterable
+        column: column to read, chunks are then pandas series.  Without
+                it chunks are dataframes for files
+        chunksize: rows per chunk for files
+        **kwargs: passed to pandas.read_csv for csv files
+
+    """
+
+    def __init__(self, source, column = None, chunksize = 100000, **kwargs):
+        self.source = source
+        self.column = column
+        self.chunksize = chunksize
+        self.kwargs = kwargs
+
+    def _read_csv(self):
+        for frame in pd.read_csv(self.source, chunksize = self.chunksize, **self.kwargs):
+            yield frame if self.column is None else frame[self.column]
+
+    def _read_parquet(self):
+        import pyarrow.parquet as pq
+        columns = None if self.column is None else [self.column]
+        for batch in pq.ParquetFile(self.source).iter_batches(batch_size = self.chunksize, columns = columns):
+            frame = batch.to_pandas()
+            yield frame if self.column is None else frame[self.column]
+
+    def __iter__(self):
+        if isinstance(self.source, str):
+            extension = os.path.splitext(self.source)[1].lower()
+            if extension in ('.parquet', '.pq'):
+                return self._read_parquet()
+            return self._read_csv()
+        if callable(self.source):
+            return iter(self.source())
+        return iter(self.source)
+
+
+def read_chunks(source, column = None, chunksize = 100000, **kwargs):
+    """
+    read_chunks reads a csv or parquet file, or wraps an iterator of
+    arrays, as a re-iterable ChunkReader
+
+    params:
+        see ChunkReader
+
+    returns:
+        reader: ChunkReader
+    """
+    return ChunkReader(source, column = column, chunksize = chunksize, **kwargs)
+
+
+def stream_stats(chunks, outputs = ('moments', 'boxplot', 'histogram', 'acf'), bins = 10,
+                 hist_range = None, max_lag = 50, k = 200, seed = None):
+    """
+    stream_stats reads chunks of one series once, in bounded memory, and
+    returns every requested statistic.
+
+    params:
+        chunks: iterable of arrays or pandas series in time order, e.g.
+                a ChunkReader with a column.  Chunks with more than one
+                column raise a ValueError
+        outputs: any of
+                 'moments': count, mean, std, min and max, exact
+                 'boxplot': boxplot_data values from a QuantileSketch,
+                            without the outliers, which need a second
+                            pass (see sketch_boxplot_data)
+                 'histogram': density histogram as np.histogram returns
+                              it, exact when hist_range is given,
+                              otherwise binned from the sketch between
+                              the exact min and max
+                 'acf': autocorrelation up to max_lag and its
+                        significance bands from an OnlineACF.  Missing
+                        values are dropped like for the other outputs, 
+                        so lags count the observed values.  NaN when 
+                        there are none
+        bins: number of histogram bins
+        hist_range: (min, max) of the histogram
+        max_lag: the largest lag for the acf
+        k: sketch size
+        seed: seed for the sketch
+
+    returns:
+        result: dict keyed by output, acf adds a 'significance' key
+    """
+    sketch = QuantileSketch(k = k, seed = seed)
+    online = OnlineACF(max_lag) if 'acf' in outputs else None
+    exact_hist = 'histogram' in outputs and hist_range is not None
+    if exact_hist:
+        edges = np.linspace(hist_range[0], hist_range[1], bins + 1)
+        counts = np.zeros(bins)
+    low = np.inf
+    high = -np.inf
+    for chunk in chunks:
+        values = np.asarray(chunk, dtype = float)
+        if values.ndim > 1 and values.shape[1] > 1:
+            raise ValueError('stream_stats summarizes one series, got chunks with {} columns; '
+                             'read files with column set'.format(values.shape[1]))
+        values = values.ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            continue
+        if online is not None:
+            online.update(values)
+        sketch.update(values)
+        low = min(low, values.min())
+        high = max(high, values.max())
+        if exact_hist:
+            counts += np.histogram(values, bins = edges)[0]
+
+    result = {}
+    if 'moments' in outputs:
+        result['moments'] = pd.Series({'count': sketch.count,
+                                       'mean': sketch.mean if sketch.count else np.nan,
+                                       'std': sketch.std,
+                                       'min': low if sketch.count else np.nan,
+                                       'max': high if sketch.count else np.nan})
+    if 'boxplot' in outputs:
+        result['boxplot'] = _box_stats(sketch.quantile(.25), sketch.quantile(.5), sketch.quantile(.75),
+                                       sketch.mean if sketch.count else np.nan, sketch.std)
+    if 'histogram' in outputs:
+        if not exact_hist:
+            edges = np.linspace(low, high, bins + 1) if sketch.count else np.linspace(0, 1, bins + 1)
+            items = np.concatenate(sketch.levels)
+            weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(sketch.levels)])
+            counts = np.histogram(items, bins = edges, weights = weights)[0]
+        total = counts.sum()
+        hist = counts / (total * np.diff(edges)) if total else counts
+        result['histogram'] = (hist, edges)
+    if online is not None:
+        result['acf'] = online.acf()
+        result['significance'] = online.significance()
+    return result
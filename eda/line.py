@@ -3,17 +3,23 @@
 
 from bokeh.plotting import figure
 from bokeh.io import curdoc
+from eda.downsample import downsample, resample_on_zoom, _in_server
 
-def bk_line(x,y, theme = False, title = '', x_axis_type = 'datetime', **kwargs):
+def bk_line(x,y, theme = False, title = '', x_axis_type = 'datetime', max_points = None, method = 'minmax', **kwargs):
     """
     Simple Line plot
+    
+    max_points: draw about this many points, decimated with method 
+                ('minmax' or 'lttb', see eda.downsample.downsample).
+                Under a bokeh server the line is re-decimated on zoom.
     """
     
     p = figure(title = title, x_axis_type=x_axis_type, **kwargs)
-    p.line(x, y)
+    line = p.line(*downsample(x, y, max_points, method))
+    if max_points is not None and _in_server():
+        resample_on_zoom(p, line, x, y, max_points, method)
     if theme:
         doc = curdoc()
         doc.theme = theme
         doc.add_root(p)
     return p
-
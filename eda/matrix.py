@@ -1,56 +1,163 @@
 # -*- coding: utf-8 -*-
 
 import numpy as np
-from sklearn.model_selection import train_test_split
+import os
+from math import comb
+from concurrent.futures import ProcessPoolExecutor
 import warnings
 import numpy.polynomial.polynomial as poly
-warnings.simplefilter('ignore', np.RankWarning)
+from eda.profiling import stage
+from eda.cache import cached
+warnings.simplefilter('ignore', getattr(np, 'RankWarning', None) or np.exceptions.RankWarning)
 import pandas as pd
-from bokeh.models import Title
-from bokeh.models import HoverTool
-from bokeh.plotting import figure
-from bokeh.io import curdoc
-from bokeh.layouts import layout
 
 #https://codefying.com/2016/08/18/two-ways-to-perform-linear-regression-in-python-with-numpy-ans-sk-learn/
 
 
-def bk_circle(x,y, alpha=0.08, size = 5, theme = False, regress = False, **kwargs):
+def bk_circle(x,y, alpha=0.08, size = 5, theme = False, regress = False, density = None, 
+              density_threshold = 100000, bins = 200, **kwargs):
+    """
+    Scatter plot of y against x, optionally with a bagged polynomial fit
     
-    df = pd.DataFrame(data = {'x':x,'y':y})
-    df.sort_values(by = 'x', inplace = True)
-    df.reset_index(drop = True, inplace = True)
-    x = df['x']
-    y = df['y']
+    Params:
+        density: bin x and y into a bins x bins grid and draw it as an 
+                 image instead of one circle per row.  Defaults to True
+                 above density_threshold rows
+        density_threshold: number of rows above which density is used
+        bins: grid size of the density image
+        regress, best_poly, degree, bags: see get_bagged_poly and 
+                 get_best_poly
+        band: shade the bootstrap prediction band of the fit
+        cv: cross validation used by best_poly, see get_best_poly
+    
+    Returns:
+        p: bokeh figure
+    """
+    from bokeh.plotting import figure
+    from bokeh.io import curdoc
+    from bokeh.models import LinearColorMapper
+    from bokeh.palettes import Blues256
+    if density is None:
+        density = len(x) > density_threshold
     p = figure()
     if theme:
         doc = curdoc()
         doc.theme = theme
         doc.add_root(p)  
-    p.circle(x, y, size=size, alpha=alpha)
+    if density:
+        x = np.asarray(x, dtype = float)
+        y = np.asarray(y, dtype = float)
+        finite = np.isfinite(x) & np.isfinite(y)
+        x = x[finite]
+        y = y[finite]
+        counts, xedges, yedges = np.histogram2d(x, y, bins = bins)
+        mapper = LinearColorMapper(palette = Blues256[::-1], low = 1, high = max(counts.max(), 1),
+                                   low_color = (0, 0, 0, 0))
+        p.image(image = [counts.T], x = xedges[0], y = yedges[0], dw = xedges[-1] - xedges[0], 
+                dh = yedges[-1] - yedges[0], color_mapper = mapper)
+        line_x = np.linspace(xedges[0], xedges[-1], bins)
+    else:
+        df = pd.DataFrame(data = {'x':x,'y':y})
+        df.sort_values(by = 'x', inplace = True)
+        df.reset_index(drop = True, inplace = True)
+        x = df['x']
+        y = df['y']
+        p.circle(x, y, size=size, alpha=alpha)
+        line_x = x
     if regress:
+        _regression_line(p, x, y, line_x, **kwargs)
+    return p
+
+
+def _fit_regression(x, y, **kwargs):
+    """
+    selects the degree (best_poly, or degree, default 1) and fits a 
+    bagged polynomial of y on x
+    
+    Returns:
+        fit: dictionary with degree, coefs, error and r_squared
+    """
+    try:
+        if kwargs['best_poly']:
+            degree,_ =  get_best_poly(x,y,3, 20, cv = kwargs.get('cv', 'random'))
+    except KeyError:
         try:
-            if kwargs['best_poly']:
-                degree,_ =  get_best_poly(x,y,3, 20)
-        except KeyError:
-            try:
-                degree = kwargs['degree'] 
-            except KeyError:
-                degree = 1
-        try:
-            bags =  kwargs['bags'] 
+            degree = kwargs['degree'] 
         except KeyError:
-            bags = 10
-        coefs, error, r_squared = get_bagged_poly(x,y, degree, bags)
-        ffit = poly.polyval(x, coefs)
-        line = p.line(x = x, y = ffit, color = 'black', line_width = 1)
-        hover = HoverTool(tooltips=[("R Squared", str(r_squared)),
-                                ("MSE", str(round(error)))])
-        hover.renderers.append(line)
-        p.tools=[hover]
-    return p
+            degree = 1
+    try:
+        bags =  kwargs['bags'] 
+    except KeyError:
+        bags = 10
+    coefs, error, r_squared, intervals = get_bagged_poly(x,y, degree, bags, intervals = True)
+    return {'degree': degree, 'coefs': coefs, 'error': error, 'r_squared': r_squared,
+            'bag_coefs': intervals['bag_coefs']}
+
+
+def _regression_line(p, x, y, line_x, fit = None, **kwargs):
+    """
+    draws a bagged polynomial of y on x over line_x with a hover showing
+    its R squared and MSE, fitting it first unless fit is given.  With 
+    band = True the 95% bootstrap prediction band is shaded under it.
+    """
+    from bokeh.models import HoverTool
+    if fit is None:
+        fit = _fit_regression(x, y, **kwargs)
+    if kwargs.get('band'):
+        low, high = poly_band(fit['bag_coefs'], line_x)
+        p.varea(x = line_x, y1 = low, y2 = high, fill_color = 'grey', fill_alpha = .3)
+    ffit = poly.polyval(line_x, fit['coefs'])
+    line = p.line(x = line_x, y = ffit, color = 'black', line_width = 1)
+    hover = HoverTool(tooltips=[("R Squared", str(fit['r_squared'])),
+                            ("MSE", str(round(fit['error'])))])
+    hover.renderers.append(line)
+    p.tools=[hover]
+
+
+def _fit_pair_task(task):
+    x, y, kwargs = task
+    return _fit_regression(x, y, **kwargs)
+
+
+def fit_pairs(df, pairs = None, workers = None, **kwargs):
+    """
+    fit_pairs runs the model selection and bagging of every pair of
+    columns up front across a pool of worker processes, so bk_matrix
+    only draws the results.  Each column is sorted once, and only the 
+    two sorted arrays of a pair are sent to a worker.
+    
+    Params:
+        df: pandas dataframe
+        pairs: list of (x, y) column pairs, defaults to every ordered 
+               pair of different columns
+        workers: number of worker processes, defaults to the number of 
+                 cores.  1 fits in this process
+        best_poly, degree, bags: see bk_circle
+    
+    Returns:
+        fits: dictionary keyed by (x, y) with the degree, coefs, error 
+              and r_squared of the regression of y on x
+    """
+    columns = list(df.columns)
+    if pairs is None:
+        pairs = [(x, y) for y in columns for x in columns if x != y]
+    values = {column: df[column].values for column in columns}
+    orders = {column: np.argsort(values[column], kind = 'mergesort') for column in set(x for x, _ in pairs)}
+    tasks = [(values[x][orders[x]], values[y][orders[x]], kwargs) for x, y in pairs]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+    if workers <= 1:
+        results = list(map(_fit_pair_task, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            results = list(executor.map(_fit_pair_task, tasks, chunksize = max(1, len(tasks) // (4 * workers))))
+    return dict(zip(pairs, results))
+
 
 def bk_hist(series, theme = False):
+    from bokeh.plotting import figure
+    from bokeh.io import curdoc
     p = figure()
     hist, edges = np.histogram(series, density=True)
     p.quad(top=hist, bottom=0, left=edges[:-1], right=edges[1:]) 
@@ -76,6 +183,7 @@ def get_poly_fit(x,y, degree):
         result: dictionary with the polynomial coefficients and cross validated error
     
     """
+    from sklearn.model_selection import train_test_split
 
     df = pd.DataFrame(data = {'x':x,'y':y})
     df.sort_values(by = 'x', inplace = True)
@@ -119,37 +227,156 @@ def get_poly_fits(x,y, degrees):
     return results
 
 
-def sample_poly_fit(x,y,degrees, samples):
+def _vandermonde(x, degree, low, high):
+    """
+    Vandermonde matrix of x mapped onto [-1, 1], which keeps the columns
+    well conditioned without changing the fitted predictions
+    """
+    half = (high - low) / 2.0 or 1.0
+    t = (np.asarray(x, dtype = float) - (high + low) / 2.0) / half
+    v = np.empty(t.shape + (degree + 1,))
+    v[..., 0] = 1.0
+    for power in range(1, degree + 1):
+        np.multiply(v[..., power - 1], t, out = v[..., power])
+    return v
+
+
+def sample_poly_fit(x,y,degrees, samples, random_state = None, chunk_size = 2**22):
     """
     sample_poly_fit returns the cross validated error 
     to a specified range of degrees, for n samples
     
+    Every sample is a random 80/20 train/test split.  The normal equations 
+    of a split's training set are those of the whole data minus those of 
+    its test points, so only the test points of each split are gathered, 
+    once, and used both for its (degree + 1) x (degree + 1) Gram matrix
+    and its predictions.  Since the columns for degree d are the first 
+    d + 1, the leading blocks of that one Gram matrix solve every degree.
+    Splits are processed in chunks of about chunk_size values, which 
+    bounds the memory whatever the length of x.
+    
     Params:
         x: independent data
         y: dependent data
         degrees: highest degree to fit a polynomial
         samples: how many samples to run
+        random_state: seed or numpy Generator for the splits
+        chunk_size: number of values held per chunk of splits
     
     Returns:
         error_df: pd.DataFrame of cross validated errors for each 
                 degree
     
     """
-    df = pd.DataFrame(data = {'x':x,'y':y})
-    df.sort_values(by = 'x', inplace = True)
-    df.reset_index(drop = True, inplace = True)
-    x = df['x']
-    y = df['y']
-    degree_range = range(degrees)
-    errors = {degree+1:[] for degree in degree_range}
-    for sample in range(samples):
-        results = get_poly_fits(x,y, degrees)
-        for key,value in results.items():
-            errors[key].append(value['error'])
-    error_df = pd.DataFrame(errors)
+    x = np.asarray(x, dtype = float)
+    y = np.asarray(y, dtype = float)
+    n = len(x)
+    rng = np.random.default_rng(random_state)
+    n_test = int(np.ceil(.2 * n))
+    
+    low, high = x.min(), x.max()
+    v = _vandermonde(x, degrees, low, high)
+    gram = v.T @ v
+    vty = v.T @ y
+    del v
+    errors = np.empty((samples, degrees))
+    step = max(1, chunk_size // n)
+    for start in range(0, samples, step):
+        stop = min(start + step, samples)
+        test = np.argpartition(rng.random((stop - start, n)), n_test - 1, axis = 1)[:, :n_test]
+        v_test = _vandermonde(x[test], degrees, low, high)
+        y_test = y[test]
+        v_test_t = np.swapaxes(v_test, 1, 2)
+        train_gram = gram - v_test_t @ v_test
+        train_vty = vty - (v_test_t @ y_test[..., None])[..., 0]
+        coefs = np.zeros((stop - start, degrees + 1, degrees))
+        for degree in range(1, degrees + 1):
+            k = degree + 1
+            try:
+                coefs[:, :k, degree - 1] = np.linalg.solve(train_gram[:, :k, :k], train_vty[:, :k, None])[..., 0]
+            except np.linalg.LinAlgError:
+                coefs[:, :k, degree - 1] = [np.linalg.lstsq(g[:k, :k], b[:k], rcond = None)[0] 
+                                            for g, b in zip(train_gram, train_vty)]
+        predict = v_test @ coefs
+        errors[start:stop] = np.mean((predict - y_test[..., None]) ** 2, axis = 1)
+    error_df = pd.DataFrame(errors, columns = range(1, degrees + 1))
     return error_df
     
-def get_best_poly(x,y,degrees, samples):
+def _nested_fits(v, y):
+    """
+    least squares fitted values of y for every degree at once, from one 
+    QR factorization of the Vandermonde matrix v, whose first d + 1
+    columns span the degree d polynomials
+    
+    Returns:
+        fitted: (n, degrees + 1) fitted values, column d for degree d
+        leverage: (n, degrees + 1) hat matrix diagonals, column d for degree d
+    """
+    q = np.linalg.qr(v)[0]
+    fitted = np.cumsum(q * (q.T @ y), axis = 1)
+    leverage = np.cumsum(q ** 2, axis = 1)
+    return fitted, leverage
+
+
+def loo_poly_fit(x, y, degrees):
+    """
+    loo_poly_fit returns the exact leave-one-out error of each degree, 
+    using the closed form e_i / (1 - h_ii) of linear least squares, 
+    from a single factorization
+    
+    Params:
+        x: independent data
+        y: dependent data
+        degrees: highest degree to fit a polynomial
+    
+    Returns:
+        error_df: pd.DataFrame with one row of leave-one-out mean
+                  squared errors for each degree
+    """
+    x = np.asarray(x, dtype = float)
+    y = np.asarray(y, dtype = float)
+    fitted, leverage = _nested_fits(_vandermonde(x, degrees, x.min(), x.max()), y)
+    residuals = (y[:, None] - fitted) / (1 - leverage)
+    errors = np.mean(residuals[:, 1:] ** 2, axis = 0)
+    return pd.DataFrame([errors], columns = range(1, degrees + 1))
+
+
+def kfold_poly_fit(x, y, degrees, folds = 5):
+    """
+    kfold_poly_fit returns the k-fold cross validated error of each 
+    degree.  Folds interleave the points in the order given, so sorted x
+    gives every fold the whole x range, and one factorization per fold 
+    covers every degree.
+    
+    Params:
+        x: independent data
+        y: dependent data
+        degrees: highest degree to fit a polynomial
+        folds: number of folds
+    
+    Returns:
+        error_df: pd.DataFrame of the error of each fold for each degree
+    """
+    x = np.asarray(x, dtype = float)
+    y = np.asarray(y, dtype = float)
+    v = _vandermonde(x, degrees, x.min(), x.max())
+    fold = np.arange(len(x)) % folds
+    errors = []
+    for f in range(folds):
+        train = fold != f
+        q, r = np.linalg.qr(v[train])
+        qty = q.T @ y[train]
+        row = []
+        for degree in range(1, degrees + 1):
+            k = degree + 1
+            coefs = np.linalg.lstsq(r[:k, :k], qty[:k], rcond = None)[0]
+            row.append(np.mean((v[~train, :k] @ coefs - y[~train]) ** 2))
+        errors.append(row)
+    return pd.DataFrame(errors, columns = range(1, degrees + 1))
+    
+
+@cached
+def get_best_poly(x,y,degrees, samples, random_state = None, cv = 'random', folds = 5):
     """
     get_best_poly returns the polynomial degree with lowest 
     average cross validated error to a  specified range of 
@@ -159,7 +386,12 @@ def get_best_poly(x,y,degrees, samples):
         x: independent data
         y: dependent data
         degrees: highest degree to fit a polynomial
-        samples: how many samples to run
+        samples: how many samples to run, for cv = 'random'
+        random_state: seed or numpy Generator for the splits
+        cv: 'random' for repeated 80/20 splits (sample_poly_fit), 'loo' 
+            for exact leave-one-out (loo_poly_fit) or 'kfold' 
+            (kfold_poly_fit).  'loo' and 'kfold' are deterministic
+        folds: number of folds for cv = 'kfold'
     
     Returns:
         error_df: pd.DataFrame of cross validated errors for each 
@@ -168,52 +400,117 @@ def get_best_poly(x,y,degrees, samples):
                     cross validated error
     
     """
-    df = pd.DataFrame(data = {'x':x,'y':y})
-    df.sort_values(by = 'x', inplace = True)
-    df.reset_index(drop = True, inplace = True)
-    x = df['x']
-    y = df['y']
-    error_df = sample_poly_fit(x,y,degrees, samples)
-    errors = pd.DataFrame(error_df.mean()).reset_index()
-    errors.columns = ['degrees', 'values']
-    errors.index =[0 for x in range(len(errors))]
-    best_poly = errors.pivot(columns = 'degrees', values = 'values').idxmin(axis=1).values[0]
+    if cv == 'random':
+        error_df = sample_poly_fit(x,y,degrees, samples, random_state = random_state)
+    elif cv == 'loo':
+        error_df = loo_poly_fit(x, y, degrees)
+    elif cv == 'kfold':
+        error_df = kfold_poly_fit(x, y, degrees, folds = folds)
+    else:
+        raise ValueError("cv must be 'random', 'loo' or 'kfold'")
+    best_poly = error_df.mean().idxmin()
     return best_poly, error_df
 
 
-def get_bagged_poly(x,y, degree, bags):
+def _unmap_coefs(coefs, low, high):
+    """
+    converts polynomial coefficients in t, x mapped onto [-1, 1] as in
+    _vandermonde, back to coefficients in x.  coefs may be a stack.
+    """
+    half = (high - low) / 2.0 or 1.0
+    center = (high + low) / 2.0
+    k = coefs.shape[-1]
+    m = np.zeros((k, k))
+    for i in range(k):
+        for j in range(i + 1):
+            m[i, j] = comb(i, j) * (-center) ** (i - j) / half ** i
+    return coefs @ m
+
+
+def poly_band(bag_coefs, x, alpha = .05):
+    """
+    poly_band returns the bootstrap prediction band of bagged polynomials
+    
+    Params:
+        bag_coefs: (bags, degree + 1) coefficients, one row per bag, as
+                   returned by get_bagged_poly with intervals = True
+        x: where to evaluate the band
+        alpha: 1 - coverage of the band
+    
+    Returns:
+        low, high: arrays of the band at x
+    """
+    predictions = poly.polyval(np.asarray(x, dtype = float), bag_coefs.T)
+    low, high = np.percentile(predictions, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis = 0)
+    return low, high
+
+
+def get_bagged_poly(x,y, degree, bags, rng = None, intervals = False, alpha = .05, chunk_size = 2**22):
     """
     get_bagged_poly returns the polynomial 
     coefficients to a specified degrees and its 
     cross validated error using a bagging with
     replacement
     
+    The bootstrap draws of a chunk of bags are turned into per-bag row 
+    counts, so the weighted normal equations of the chunk come from a 
+    single matrix product and are solved as one stack.  Chunks hold about
+    chunk_size counts, which bounds the memory whatever bags and the 
+    length of x.
+    
     Params:
         x: independent data
         y: dependent data
         degree: degree to fit a polynomial
         bags: how many bags to run
+        rng: numpy Generator or seed for the split and the bootstrap
+        intervals: also return bootstrap confidence intervals
+        alpha: 1 - coverage of the intervals
+        chunk_size: number of row counts held per chunk of bags
     
     Returns:
-        result: int, the degree with the lowest average 
-                cross validated error
+        coefs: mean of the bag coefficients
+        error: mean squared error on the held out 20%
+        r_squared: r squared on the training 80%
+        intervals: only when intervals is True, dictionary with 
+                   bag_coefs (one row per bag, see poly_band) and the
+                   low and high percentile of each coefficient
     
     """
-    df = pd.DataFrame(data = {'x':x,'y':y})
-    df.sort_values(by = 'x', inplace = True)
-    df.reset_index(drop = True, inplace = True)
-    x = df['x']
-    y = df['y']
-    x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2)
-    bag_range = range(bags)
-    results = []
-    for bag in bag_range:
-        sample_df = pd.DataFrame({'x':x_train, 'y':y_train}).sample(frac = .8, replace = True)
-        x_sample = sample_df['x']
-        y_sample = sample_df['y']
-        coefs = poly.polyfit(x_sample,y_sample, degree)
-        results.append(coefs)
-    coefs = np.mean(np.array(results), axis = 0)
+    rng = np.random.default_rng(rng)
+    x = np.asarray(x, dtype = float)
+    y = np.asarray(y, dtype = float)
+    n = len(x)
+    split = rng.permutation(n)
+    n_test = int(np.ceil(.2 * n))
+    test, train = split[:n_test], split[n_test:]
+    x_train, x_test, y_train, y_test = x[train], x[test], y[train], y[test]
+    m = len(x_train)
+    
+    size = int(round(.8 * m))
+    low, high = x_train.min(), x_train.max()
+    v = _vandermonde(x_train, degree, low, high)
+    k = degree + 1
+    vv = (v[:, :, None] * v[:, None, :]).reshape(m, k * k)
+    vy = v * y_train[:, None]
+    bag_coefs = np.empty((bags, k))
+    step = max(1, chunk_size // max(m, size))
+    for start in range(0, bags, step):
+        stop = min(start + step, bags)
+        c = stop - start
+        draws = rng.integers(0, m, size = (c, size))
+        counts = np.bincount((draws + m * np.arange(c)[:, None]).ravel(), 
+                             minlength = c * m).reshape(c, m).astype(float)
+        del draws
+        xtx = (counts @ vv).reshape(c, k, k)
+        xty = counts @ vy
+        try:
+            bag_coefs[start:stop] = np.linalg.solve(xtx, xty[..., None])[..., 0]
+        except np.linalg.LinAlgError:
+            bag_coefs[start:stop] = [np.linalg.lstsq(a, b, rcond = None)[0] for a, b in zip(xtx, xty)]
+    bag_coefs = _unmap_coefs(bag_coefs, low, high)
+    
+    coefs = np.mean(bag_coefs, axis = 0)
     yhat = poly.polyval(x_train,coefs)        
     ybar = y_train.mean()          
     ssres = np.sum((y_train-yhat)**2)   
@@ -221,34 +518,74 @@ def get_bagged_poly(x,y, degree, bags):
     r_squared = 1 - ssres / sstot
     predict=poly.polyval(x_test, coefs)
     error=np.mean((predict-y_test)**2)
+    if intervals:
+        low, high = np.percentile(bag_coefs, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis = 0)
+        return coefs, error, r_squared, {'bag_coefs': bag_coefs, 'low': low, 'high': high}
     return coefs, error, r_squared
 
-def bk_matrix(df, theme = False, w_h = 400, alpha = .1, regress = False, **kwargs):
-    rows = []
-    for y in df.columns:
-        i = 0
-        r = []
-        for x in df.columns:
+def bk_matrix(df, theme = False, w_h = 400, alpha = .1, size = 5, regress = False, workers = None, **kwargs):
+    """
+    Scatter matrix of every pair of columns with histograms on the 
+    diagonal.  All scatter panels draw from one ColumnDataSource, so each
+    column is serialized once and selections are linked across panels.
+    With regress every pair is fitted up front by fit_pairs across 
+    worker processes, and each fit is drawn on a grid of 200 points over 
+    its column's range, so the lines do not grow with the rows.
+    
+    Params:
+        df: pandas dataframe
+        w_h: width and height of each panel
+        regress, best_poly, degree, bags: see bk_circle
+        workers: number of worker processes for fit_pairs
+    
+    Returns:
+        layout of the panels
+    """
+    from bokeh.models import Title, ColumnDataSource
+    from bokeh.plotting import figure
+    from bokeh.io import curdoc
+    from bokeh.layouts import layout
+    columns = list(df.columns)
+    names = {column: str(column) for column in columns}
+    values = {column: df[column].values for column in columns}
+    if regress:
+        with stage('bk_matrix', 'compute', rows = len(df)):
+            fits = fit_pairs(df, workers = workers, **kwargs)
+            line_x = {column: np.linspace(np.nanmin(values[column]), np.nanmax(values[column]), 200) 
+                      for column in columns}
+    with stage('bk_matrix', 'figure', rows = len(df)):
+        source = ColumnDataSource(data = {names[column]: values[column] for column in columns})
+        rows = []
+        for y in columns:
+            i = 0
+            r = []
+            for x in columns:
             
-            if x == y:
-                p = bk_hist(df[y], theme = theme)
-            else: 
-                d = df[[y, x]].reset_index(drop = True)
-                d.sort_values(by = y, inplace = True)
-                p = bk_circle(d[x],d[y], theme = theme, alpha = alpha, regress = regress, **kwargs)
+                if x == y:
+                    p = bk_hist(values[y], theme = theme)
+                else: 
+                    p = figure(tools = 'box_select,lasso_select,reset')
+                    if theme:
+                        doc = curdoc()
+                        doc.theme = theme
+                        doc.add_root(p)
+                    p.circle(names[x], names[y], source = source, size = size, alpha = alpha)
+                    if regress:
+                        _regression_line(p, None, None, line_x[x], fit = fits[(x, y)], **kwargs)
                 
-            p.toolbar.logo=None
-            p.toolbar_location = None
-            p.width = w_h
-            p.height = w_h
-            p.axis.visible = False
-            if i ==0:
-                p.add_layout(Title(text=y, align="center", text_font_size = '14px'), "left")
-            r.append(p)
-            i += 1
-        rows.append(r)
-    for p, col in zip(rows[-1], list(df.columns)):
-        p.add_layout(Title(text=col, align="center", text_font_size = '14px'), "below")
-    
-    
-    return layout(rows)
\ No newline at end of file
+                p.toolbar.logo=None
+                p.toolbar_location = None
+                p.width = w_h
+                p.height = w_h
+                p.axis.visible = False
+                if i ==0:
+                    p.add_layout(Title(text=y, align="center", text_font_size = '14px'), "left")
+                r.append(p)
+                i += 1
+            rows.append(r)
+        for p, col in zip(rows[-1], columns):
+            p.add_layout(Title(text=col, align="center", text_font_size = '14px'), "below")
+    
+    
+        p = layout(rows)
+    return p
\ No newline at end of file
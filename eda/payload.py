@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Compact payloads for figures that are published as html or json.
+
+Bokeh sends numpy arrays as base64 typed arrays, but pandas objects,
+python lists and int64 or datetime columns can end up as plain json
+lists of numbers or timestamps, several times larger.  compact rewrites
+the data of every ColumnDataSource of a figure or layout as numpy arrays
+bokeh can send in binary, and export_html does so before saving a
+standalone page.
+
+    from eda.payload import export_html
+
+    report = export_html(bk_matrix(df), 'matrix.html', float32 = True)
+"""
+
+import json
+import numpy as np
+import pandas as pd
+from eda.downsample import _numeric
+
+
+def _compact_column(values, float32 = False):
+    """
+    values as an array bokeh encodes in binary: datetimes as float
+    milliseconds since epoch, int64 as int32 when it fits, floats as
+    float32 when float32.  Strings and other objects are kept as they are
+    """
+    if isinstance(values, (pd.Series, pd.Index)) and pd.api.types.is_datetime64_any_dtype(values):
+        values = pd.DatetimeIndex(pd.to_datetime(values, utc = True)).tz_localize(None)
+    if isinstance(values, (pd.Series, pd.Index)):
+        values = values.to_numpy()
+    array = np.asarray(values)
+    if array.dtype.kind in 'OUSV' or array.ndim != 1:
+        return values
+    if array.dtype.kind == 'M':
+        return _numeric(array)
+    if array.dtype.kind in 'iu':
+        info = np.iinfo(np.int32)
+        if len(array) == 0 or (array.min() >= info.min and array.max() <= info.max):
+            return array.astype(np.int32)
+        return array.astype(float)
+    if array.dtype.kind == 'f':
+        return array.astype(np.float32 if float32 else float)
+    return array
+
+
+def compact(obj, float32 = False):
+    """
+    compact rewrites, in place, every ColumnDataSource of a bokeh figure or
+    layout as numpy arrays that are serialized as binary typed arrays
+
+    params:
+        obj: bokeh figure or layout
+        float32: downcast float columns to float32, halving them at the
+                 cost of about 7 significant digits.  Datetimes stay
+                 float64 milliseconds
+
+    returns:
+        obj
+    """
+    from bokeh.models import ColumnDataSource
+    for source in obj.select({'type': ColumnDataSource}):
+        source.data = {name: _compact_column(values, float32 = float32)
+                       for name, values in source.data.items()}
+    return obj
+
+
+def _source_bytes(source):
+    """
+    json bytes of the data of source, serialized on a copy so that sources
+    already in a document or shared between figures can be measured
+    """
+    from bokeh.embed import json_item
+    from bokeh.models import ColumnDataSource
+    return len(json.dumps(json_item(ColumnDataSource(data = dict(source.data)))))
+
+
+def payload_report(obj):
+    """
+    payload_report measures the json bokeh sends for obj and the data of
+    each of its figures.  Data sources shared between figures are sent
+    once but counted with each figure
+
+    params:
+        obj: bokeh figure or layout
+
+    returns:
+        report: pandas dataframe with the title, number of data sources
+                and data bytes of each figure, and a total row with the
+                json bytes of all of obj
+    """
+    from bokeh.embed import json_item
+    from bokeh.models import Plot, ColumnDataSource
+    sizes = {}
+    rows = []
+    for i, plot in enumerate(obj.select({'type': Plot})):
+        title = plot.title.text if plot.title is not None and plot.title.text else 'figure {}'.format(i)
+        sources = list(plot.select({'type': ColumnDataSource}))
+        for source in sources:
+            if source.id not in sizes:
+                sizes[source.id] = _source_bytes(source)
+        rows.append({'figure': title,
+                     'sources': len(sources),
+                     'bytes': sum(sizes[source.id] for source in sources)})
+    rows.append({'figure': 'total',
+                 'sources': len(list(obj.select({'type': ColumnDataSource}))),
+                 'bytes': len(json.dumps(json_item(obj)))})
+    return pd.DataFrame(rows, columns = ['figure', 'sources', 'bytes'])
+
+
+def export_html(obj, filename, float32 = False, title = '', resources = 'cdn'):
+    """
+    export_html compacts obj and saves it as a standalone html page
+
+    params:
+        obj: bokeh figure or layout
+        filename: path of the html file
+        float32: see compact
+        title: title of the page
+        resources: 'cdn' links bokeh's javascript, 'inline' embeds it
+
+    returns:
+        report: payload_report of the compacted obj
+    """
+    from bokeh.io import save
+    from bokeh.resources import CDN, INLINE
+    compact(obj, float32 = float32)
+    save(obj, filename = filename, resources = INLINE if resources == 'inline' else CDN, title = title)
+    return payload_report(obj)
@@ -1,12 +1,39 @@
 # -*- coding: utf-8 -*-
 
-from eda.line import bk_line
-from eda.control import control_plot
-from eda.matrix import bk_circle, bk_hist, bk_matrix
-from eda.autocorrelation import autocor
-from eda.stl import stl_plot
-from bokeh.palettes import all_palettes
-from eda.theme import theme
-colors = all_palettes['Colorblind'][8]
+from importlib import import_module
+
+_lazy = {
+    'bk_line': 'eda.line',
+    'control_plot': 'eda.control',
+    'bk_circle': 'eda.matrix',
+    'bk_hist': 'eda.matrix',
+    'bk_matrix': 'eda.matrix',
+    'autocor': 'eda.autocorrelation',
+    'stl_plot': 'eda.stl',
+    'all_palettes': 'bokeh.palettes',
+    'theme': 'eda.theme',
+}
+
+__all__ = list(_lazy) + ['colors']
+
+
+def __getattr__(name):
+    """
+    imports the plotting entry points on first use (PEP 562), so importing
+    eda.plot does not load bokeh, scikit-learn or an stl backend until a 
+    plot is made
+    """
+    if name == 'colors':
+        value = __getattr__('all_palettes')['Colorblind'][8]
+    elif name in _lazy:
+        value = getattr(import_module(_lazy[name]), name)
+    else:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
 
 #theme = Theme(json = yaml.safe_load(open('eda/theme.yml')))
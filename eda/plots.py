@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 from bokeh.io import reset_output
-from bokeh.models import Legend, DatetimeTickFormatter
+from bokeh.models import Legend, DatetimeTickFormatter, ColumnDataSource
 from bokeh.plotting import figure
 from bokeh.layouts import gridplot, layout
 from bokeh.palettes import all_palettes
 import numpy as np
 import pandas as pd
-from eda.boxplot import boxplot_data
+from eda.control import control_limits, _limit_lines
+from eda.autocorrelation import acf, significance
+from eda.downsample import downsample, resample_on_zoom, _in_server, _numeric
+from eda.profiling import stage
 from bokeh.io import show
 
 
@@ -16,27 +19,29 @@ colors = all_palettes['Colorblind'][8]
 def bok_sp(plot_dict, **kwargs):
     if kwargs: figsize = kwargs['figsize']
     else: figsize = (800,400)
-    plot_list = []
-    plot_width, plot_height = figsize
-    i = 0
-    for unit,values in plot_dict.items():
-        p = figure(plot_width=plot_width, plot_height=plot_height)
-        p.xaxis.formatter = DatetimeTickFormatter()
-        glyph_list = []
-        column_list = []
-        for data in values:
-            column_name,x,y = data 
-            g = p.line(x = x, y = y, line_width = 2, color = colors[i])
-            i += 1
-            column_list.append(column_name)
-            glyph_list.append(g)
-        items = [(column, [glyph]) for column,glyph in zip(column_list, glyph_list)]
-        legend = Legend(items = items, location = (40,0))
-        p.add_layout(legend, 'below')
-        plot_list.append(p)
-    grid = [[p] for p in plot_list]
-    p = gridplot(grid)
-    reset_output()  
+    rows = sum(len(y) for values in plot_dict.values() for _, _, y in values)
+    with stage('bok_sp', 'figure', rows = rows):
+        plot_list = []
+        plot_width, plot_height = figsize
+        i = 0
+        for unit,values in plot_dict.items():
+            p = figure(plot_width=plot_width, plot_height=plot_height)
+            p.xaxis.formatter = DatetimeTickFormatter()
+            glyph_list = []
+            column_list = []
+            for data in values:
+                column_name,x,y = data 
+                g = p.line(x = x, y = y, line_width = 2, color = colors[i])
+                i += 1
+                column_list.append(column_name)
+                glyph_list.append(g)
+            items = [(column, [glyph]) for column,glyph in zip(column_list, glyph_list)]
+            legend = Legend(items = items, location = (40,0))
+            p.add_layout(legend, 'below')
+            plot_list.append(p)
+        grid = [[p] for p in plot_list]
+        p = gridplot(grid)
+        reset_output()  
     return p
 
 
@@ -56,6 +61,137 @@ def create_plot_dict(df):
     return plot_dict
 
 
+
+def plot_groups(df):
+    """
+    plot_groups groups the columns of df by their units, like
+    create_plot_dict but without copying any data
+
+    returns:
+        groups: dict of units to a list of (column, column_name)
+    """
+    groups = {}
+    for column, value in df.__dict__['metadata'].items():
+        groups.setdefault(value['units'], []).append((column, value['path']))
+    return groups
+
+
+class StreamingGrid:
+    """
+    StreamingGrid is the live version of bok_sp: one figure per units group,
+    each drawn from a single ColumnDataSource that new rows are streamed
+    into, so the browser holds at most rollover rows per group however
+    long the feed runs.
+
+    params:
+        groups: dict of units to a list of (column, column_name), see
+                plot_groups
+        rollover: number of rows each figure keeps
+        figsize: (width, height) of each figure
+
+    attributes:
+        layout: the gridplot to add to a bokeh document
+        sources: dict of units to ColumnDataSource
+
+    """
+
+    def __init__(self, groups, rollover = 10000, figsize = (800, 400)):
+        self.groups = groups
+        self.rollover = rollover
+        self.sources = {}
+        plot_width, plot_height = figsize
+        plot_list = []
+        i = 0
+        for units, columns in groups.items():
+            keys = ['y{}'.format(j) for j in range(len(columns))]
+            source = ColumnDataSource(data = {key: np.array([], dtype = float) for key in ['x'] + keys})
+            p = figure(plot_width=plot_width, plot_height=plot_height)
+            p.xaxis.formatter = DatetimeTickFormatter()
+            items = []
+            for key, (column, column_name) in zip(keys, columns):
+                g = p.line(x = 'x', y = key, source = source, line_width = 2, color = colors[i % len(colors)])
+                i += 1
+                items.append((column_name, [g]))
+            legend = Legend(items = items, location = (40,0))
+            p.add_layout(legend, 'below')
+            plot_list.append(p)
+            self.sources[units] = source
+        self.layout = gridplot([[p] for p in plot_list])
+
+    def push(self, df):
+        """
+        streams the rows of df, indexed by time, into every figure.
+        Columns missing from df are streamed as NaN
+        """
+        if len(df) == 0:
+            return
+        x = _numeric(df.index.values)
+        for units, columns in self.groups.items():
+            data = {'x': x}
+            for j, (column, _) in enumerate(columns):
+                data['y{}'.format(j)] = (np.asarray(df[column], dtype = float) if column in df 
+                                         else np.full(len(df), np.nan))
+            self.sources[units].stream(data, rollover = self.rollover)
+
+
+def _batches(feed, batch):
+    if isinstance(feed, pd.DataFrame):
+        return (feed.iloc[i:i + batch] for i in range(0, len(feed), batch))
+    if callable(feed):
+        return iter(feed())
+    return iter(feed)
+
+
+def bok_sp_app(df, feed = None, rollover = 10000, period = 1000, batch = 1000, figsize = (800,400)):
+    """
+    bok_sp_app makes a bokeh server app streaming the columns of df, grouped
+    by units as bok_sp does.  Each period the next batch of rows is pushed
+    into the figures, older rows roll over.
+
+        from bokeh.server.server import Server
+        server = Server({'/': bok_sp_app(df, feed = plant_feed)})
+        server.start(); server.io_loop.start()
+
+    Every browser session gets its own grid and its own feed, so feed is 
+    a function returning a new iterator, called once per session.  A 
+    single iterator would be shared by the sessions, each taking part of 
+    its batches, and raises a TypeError.
+
+    params:
+        df: dataframe with the units metadata of create_plot_dict
+        feed: function returning an iterator of dataframes with the 
+              columns of df, e.g. reading new rows from the plant 
+              historian, or a list of dataframes.  Without it df itself 
+              is replayed in batches of batch rows
+        rollover: number of rows each figure keeps
+        period: milliseconds between pushes
+        batch: rows per push when replaying a dataframe
+        figsize: (width, height) of each figure
+
+    returns:
+        app: function of a bokeh document, for bokeh.server or show
+    """
+    if feed is not None and not callable(feed) and iter(feed) is feed:
+        raise TypeError('feed must be a function returning a new iterator for each session, '
+                        'not an iterator shared by every session')
+    groups = plot_groups(df)
+
+    def app(doc):
+        grid = StreamingGrid(groups, rollover = rollover, figsize = figsize)
+        batches = _batches(df if feed is None else feed, batch)
+
+        def update():
+            chunk = next(batches, None)
+            if chunk is None:
+                doc.remove_periodic_callback(callback)
+                return
+            grid.push(chunk)
+
+        doc.add_root(grid.layout)
+        callback = doc.add_periodic_callback(update, period)
+
+    return app
+
 def bk_circle(x,y, w=200, h = 200, alpha=0.1):
     p = figure(plot_width=w, plot_height=h)
     p.circle(x, y, size=5, color=colors[0], alpha=alpha)
@@ -73,29 +209,10 @@ def bk_lag(series, lags):
     p = gridplot(plot_list, ncols=4, plot_width=200, plot_height=200)
     return p
 
-def acf(series):
-    n = len(series)
-    data = np.asarray(series)
-    mean = np.mean(data)
-    c0 = np.sum((data - mean) ** 2) / float(n)
-    def r(h):
-        acf_lag = ((data[:n - h] - mean) * (data[h:] - mean)).sum() / float(n) / c0
-        return round(acf_lag, 3)
-    x = np.arange(n) # Avoiding lag 0 calculation
-    acf_coeffs = pd.Series(map(r, x)).round(decimals = 3)
-    acf_coeffs = acf_coeffs + 0
-    return acf_coeffs
-
-def significance(series):
-    n = len(series)
-    z95 = 1.959963984540054 / np.sqrt(n)
-    z99 = 2.5758293035489004 / np.sqrt(n)
-    return(z95,z99)
-    
-def bk_autocor(series):
-    x = pd.Series(range(1, len(series)+1), dtype = float)
+def bk_autocor(series, max_lag = None):
     z95, z99 = significance(series)
-    y = acf(series)
+    y = acf(series, max_lag = max_lag).round(decimals = 3)
+    x = pd.Series(range(1, len(y)+1), dtype = float)
     p = figure(title='Time Series Auto-Correlation', plot_width=1000,
                plot_height=500, x_axis_label="Lag", y_axis_label="Autocorrelation")
     p.line(x, z99, line_dash='dashed', line_color='grey')
@@ -110,9 +227,11 @@ def bk_autocor(series):
     p.outline_line_alpha = 0.0
     return p
 
-def bk_line(x,y, w = 1000, h = 300, title = '', x_axis_type = 'datetime', **kwargs ):
+def bk_line(x,y, w = 1000, h = 300, title = '', x_axis_type = 'datetime', max_points = None, method = 'minmax', **kwargs ):
     p = figure(plot_width=w, plot_height=h, x_axis_type = x_axis_type, title = title, **kwargs)
-    p.line(x, y, color=colors[0])
+    line = p.line(*downsample(x, y, max_points, method), color=colors[0])
+    if max_points is not None and _in_server():
+        resample_on_zoom(p, line, x, y, max_points, method)
     p.xgrid.visible = False
     p.ygrid.visible = False
     p.outline_line_width  = 0
@@ -136,18 +255,11 @@ def bk_decompose(df):
     p = gridplot(plot_list, ncols=1, plot_height = 225, plot_width = 800)
     return p
 
-def process_control_plot(series, w = 1000, h = 300, title = ''):
+def process_control_plot(series, w = 1000, h = 300, title = '', max_points = None):
     x = series.index
     y = series.values
-    quantiles,outliers = boxplot_data(series)
-    p = bk_line(x,y,w,h, title, toolbar_location = 'above')
-    s3 = p.line(x, series.mean()+3*series.std(), line_color = 'red')
-    s2 = p.line(x, series.mean()+2*series.std(), line_color = 'grey')
-    s1 = p.line(x, series.mean()+series.std(), line_dash='dashed', line_color='grey')
-    m = p.line(x, series.mean(), line_color='black')
-    p.line(x, series.mean()-series.std(), line_dash='dashed', line_color='grey')
-    p.line(x, series.mean()-2*series.std(), line_color = 'grey')
-    p.line(x, series.mean()-3*series.std(), line_color = 'red')
+    p = bk_line(x,y,w,h, title, max_points = max_points, toolbar_location = 'above')
+    s3, s2, s1, m = _limit_lines(p, x, control_limits(series), line_width = 1)
     legend = Legend(items=[
     ('3 standard deviations' , [s3]),
     ('2 standard deviations' , [s2]),
@@ -165,18 +277,20 @@ def bk_hist(series, w = 200, h = 200, c = colors[0]):
     return p
   
 def bk_matrix(df):
+    columns = list(df.columns)
+    names = {c: str(c) for c in columns}
+    source = ColumnDataSource(data = {names[c]: df[c].values for c in columns})
     rows = []
-    for c in df.columns:
+    for c in columns:
         r = []
-        for c2 in df.columns:
+        for c2 in columns:
             
             if c == c2:
                 p = bk_hist(df[c])
                 p.xaxis.axis_label = c
             else: 
-                d = df[[c, c2]].reset_index(drop = True)
-                d.sort_values(by = c, inplace = True)
-                p = bk_circle(d[c2],d[c])
+                p = figure(plot_width=200, plot_height=200, tools = 'box_select,lasso_select,reset')
+                p.circle(names[c2], names[c], source = source, size=5, color=colors[0], alpha=0.1)
                 p.xaxis.axis_label = c2
                 p.yaxis.axis_label = c
             p.toolbar.logo=None
@@ -184,9 +298,3 @@ def bk_matrix(df):
             r.append(p)      
         rows.append(r)
     return layout(rows)
-    
-
-
-
-
-
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in profiling of the plot builders.
+
+    from eda.profiling import Profile
+
+    with Profile() as prof:
+        p = control_plot(series)
+        prof.serialize(p, 'control_plot')
+    prof.to_json('control_plot.json')
+
+Inside the block autocor, box_plot, control_plot, bk_matrix, stl_plot and
+bok_sp record each stage they run, 'compute' for the statistics and
+'figure' for building the bokeh models, with its wall time, the rows it
+processed and the bytes it allocated at its peak.  Outside a Profile
+block stage does nothing.
+"""
+
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+import pandas as pd
+
+
+_profiles = []
+_stages = []
+
+
+def _fold_peak():
+    """
+    credits the tracemalloc peak so far to every open stage and resets it,
+    so nested stages each keep their own peak
+    """
+    peak = tracemalloc.get_traced_memory()[1]
+    for frame in _stages:
+        frame['peak'] = max(frame['peak'], peak)
+    tracemalloc.reset_peak()
+
+
+@contextmanager
+def stage(function, name, rows = None):
+    """
+    stage times the enclosed block and records it with every active
+    Profile
+
+    params:
+        function: name of the builder, e.g. 'control_plot'
+        name: name of the stage, e.g. 'compute' or 'figure'
+        rows: number of rows the stage processes
+
+    yields:
+        frame: dict of the stage, the block can set its 'rows' when they
+               are only known at the end, before the record is made
+    """
+    if not _profiles:
+        yield {'rows': rows}
+        return
+    memory = tracemalloc.is_tracing()
+    if memory:
+        _fold_peak()
+        current = tracemalloc.get_traced_memory()[0]
+    else:
+        current = 0
+    frame = {'start': current, 'peak': current, 'rows': rows}
+    _stages.append(frame)
+    start = time.perf_counter()
+    try:
+        yield frame
+    finally:
+        seconds = time.perf_counter() - start
+        if memory and tracemalloc.is_tracing():
+            _fold_peak()
+        _stages.pop()
+        record = {'function': function,
+                  'stage': name,
+                  'seconds': seconds,
+                  'rows': frame['rows'],
+                  'bytes': frame['peak'] - frame['start'] if memory else None,
+                  'depth': len(_stages)}
+        for profile in _profiles:
+            profile.record(record)
+
+
+class Profile:
+    """
+    Profile collects the stage records of every instrumented builder called
+    inside its with block.  Stages called from within another stage, like
+    the autocor panel of stl_plot, have a larger depth.
+
+    params:
+        memory: trace allocations with tracemalloc, which slows the code
+                down.  Without it bytes is None
+        callback: called with each record as it is made, e.g. to send it
+                  to a structured log:
+                  Profile(callback = lambda r: logger.info(json.dumps(r)))
+
+    """
+
+    def __init__(self, memory = True, callback = None):
+        self.memory = memory
+        self.callback = callback
+        self.records = []
+        self._started = False
+
+    def __enter__(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+        _profiles.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _profiles.remove(self)
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+        return False
+
+    def record(self, record):
+        self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    def serialize(self, obj, function = ''):
+        """
+        serializes a bokeh figure or layout as bokeh.embed.json_item does
+        for the page and records it as a 'serialize' stage, rows being the
+        length of the json
+
+        returns:
+            item: the json string
+        """
+        from bokeh.embed import json_item
+        with stage(function, 'serialize') as frame:
+            item = json.dumps(json_item(obj))
+            frame['rows'] = len(item)
+        return item
+
+    def to_frame(self):
+        """
+        returns:
+            df: pandas dataframe with one row per record
+        """
+        return pd.DataFrame(self.records, columns = ['function', 'stage', 'seconds', 'rows', 'bytes', 'depth'])
+
+    def to_json(self, path = None):
+        """
+        the records as a json list, written to path when given
+
+        returns:
+            text: the json string
+        """
+        text = json.dumps(self.records)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
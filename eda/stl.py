@@ -1,16 +1,315 @@
 # -*- coding: utf-8 -*-
 
 import pandas as pd
-from eda.line import bk_line
-from rpy2.robjects import r, pandas2ri
 import numpy as np
-from rpy2.robjects.packages import importr
-from eda.autocorrelation import autocor
-from bokeh.io import curdoc
-from bokeh.layouts import gridplot
+from math import ceil
+import os
+from concurrent.futures import ProcessPoolExecutor
+from eda.profiling import stage
+from eda.cache import cached
 
 
-def decompose(series, frequency, s_window = 'periodic', log = False, theme = False, **kwargs):
+def _nextodd(x):
+    x = int(round(x))
+    if x % 2 == 0:
+        x += 1
+    return x
+
+
+def _odd_window(x):
+    x = max(3, int(x))
+    if x % 2 == 0:
+        x += 1
+    return x
+
+
+def _loess_fit(y, xs, nleft, width, length, degree, rw = None):
+    """
+    local weighted regression of y (..., n) at the positions xs, each 
+    fitted on the width points starting at nleft (stlest in Cleveland 
+    et al.).  All positions, and all rows of a 2-d y, are fitted at once.
+    
+    returns:
+        fit: fitted values (..., len(xs))
+        ok: False where every weight in the window was zero
+    """
+    n = y.shape[-1]
+    j = nleft[:, None] + np.arange(width)
+    h = np.maximum(xs - nleft, nleft + width - 1 - xs).astype(float)
+    if length > n:
+        h += (length - n) // 2
+    r = np.abs(j - xs[:, None]) / np.where(h > 0, h, 1)[:, None]
+    w = np.where(r <= .001, 1.0, (1 - np.minimum(r, 1) ** 3) ** 3)
+    w[r > .999] = 0
+    if rw is not None:
+        w = w * rw[..., j]
+    a = w.sum(axis = -1)
+    ok = a > 0
+    w = w / np.where(ok, a, 1)[..., None]
+    if degree > 0:
+        center = (w * j).sum(axis = -1)
+        c = (w * (j - center[..., None]) ** 2).sum(axis = -1)
+        slope = (h > 0) & (np.sqrt(c) > .001 * (n - 1))
+        b = np.where(slope, (xs - center) / np.where(slope, c, 1), 0)
+        w = w * (b[..., None] * (j - center[..., None]) + 1)
+    fit = (w * y[..., j]).sum(axis = -1)
+    return fit, ok
+
+
+def _loess(y, length, degree, jump, rw = None):
+    """
+    loess smooth along the last axis of y with a window of length points,
+    evaluated every jump points and linearly interpolated in between 
+    (stless in Cleveland et al.)
+    """
+    n = y.shape[-1]
+    if n < 2:
+        return y.copy()
+    jump = max(1, min(jump, n - 1))
+    width = min(length, n)
+    nsh = (length + 1) // 2
+    xs = np.arange(0, n, jump)
+    nleft = np.clip(xs - nsh + 1, 0, n - width)
+    if xs[-1] != n - 1:
+        # the last point reuses the window of the last jump, as stless does
+        xs = np.append(xs, n - 1)
+        nleft = np.append(nleft, nleft[-1])
+    fit, ok = _loess_fit(y, xs, nleft, width, length, degree, rw)
+    ys = np.where(ok, fit, y[..., xs])
+    if len(xs) == n:
+        return ys
+    positions = np.arange(n)
+    i = np.clip(np.searchsorted(xs, positions, side = 'right') - 1, 0, len(xs) - 2)
+    t = (positions - xs[i]) / (xs[i + 1] - xs[i]).astype(float)
+    return ys[..., i] * (1 - t) + ys[..., i + 1] * t
+
+
+def _cycle_subseries_smooth(y, period, length, degree, jump, rw = None):
+    """
+    smooths every cycle-subseries of y and extends each by one cycle at
+    both ends (stlss in Cleveland et al.).  Subseries of equal length are
+    smoothed together as the rows of one matrix.
+    
+    returns:
+        season: array of length len(y) + 2 * period
+    """
+    n = len(y)
+    q, rem = divmod(n, period)
+    season = np.empty(n + 2 * period)
+    for rows, k in ((np.arange(rem), q + 1), (np.arange(rem, period), q)):
+        if len(rows) == 0:
+            continue
+        idx = rows[:, None] + period * np.arange(k)
+        sub = y[idx]
+        sub_rw = None if rw is None else rw[idx]
+        smooth = _loess(sub, length, degree, jump, sub_rw)
+        width = min(length, k)
+        xs = np.array([-1, k])
+        nleft = np.array([0, k - width])
+        ends, ok = _loess_fit(sub, xs, nleft, width, length, degree, sub_rw)
+        ok = np.broadcast_to(ok, ends.shape)
+        first = np.where(ok[:, 0], ends[:, 0], smooth[:, 0])
+        last = np.where(ok[:, 1], ends[:, 1], smooth[:, -1])
+        out = rows[:, None] + period * np.arange(k + 2)
+        season[out] = np.column_stack([first, smooth, last])
+    return season
+
+
+def _moving_average(x, length):
+    c = np.cumsum(np.concatenate([[0.0], x]))
+    return (c[length:] - c[:-length]) / float(length)
+
+
+def _robustness_weights(y, fit):
+    r = np.abs(y - fit)
+    n = len(r)
+    mid1 = n // 2
+    mid2 = n - mid1 - 1
+    r_sorted = np.partition(r, [mid2, mid1])
+    cmad = 3.0 * (r_sorted[mid1] + r_sorted[mid2])
+    safe = cmad if cmad > 0 else 1.0
+    rw = np.where(r <= .999 * cmad, (1 - (r / safe) ** 2) ** 2, 0.0)
+    rw[r <= .001 * cmad] = 1.0
+    return rw
+
+
+def stl(values, period, s_window = 'periodic', s_degree = 0, t_window = None, 
+        t_degree = 1, l_window = None, l_degree = None, s_jump = None,
+        t_jump = None, l_jump = None, robust = False, inner = None, outer = None):
+    """
+    Seasonal-trend decomposition by loess of a numpy array, a port of 
+    Cleveland et al. (1990) with the defaults of R's stats::stl.
+    https://www.rdocumentation.org/packages/stats/versions/3.4.3/topics/stl
+    
+    params:
+        values: array of observations without missing values
+        
+        period: the number of observations per cycle
+        
+        s_window: either the string "periodic" or the span (in lags) of 
+                 the loess window for seasonal extraction, which should 
+                 be odd and at least 7
+        
+        the remaining params are those of R's stl with "." replaced by "_"
+    
+    returns:
+        seasonal, trend, remainder: numpy arrays the length of values
+    """
+    y = np.asarray(values, dtype = float)
+    n = len(y)
+    period = int(period)
+    if period < 2 or n <= 2 * period:
+        raise ValueError('series is not periodic or has less than two periods')
+    periodic = isinstance(s_window, str)
+    if periodic:
+        if s_window != 'periodic':
+            raise ValueError("unknown string value for s_window")
+        s_window = 10 * n + 1
+        s_degree = 0
+    if t_window is None:
+        t_window = _nextodd(ceil(1.5 * period / (1 - 1.5 / s_window)))
+    if l_window is None:
+        l_window = _nextodd(period)
+    if l_degree is None:
+        l_degree = t_degree
+    if s_jump is None:
+        s_jump = int(ceil(s_window / 10.0))
+    if t_jump is None:
+        t_jump = int(ceil(t_window / 10.0))
+    if l_jump is None:
+        l_jump = int(ceil(l_window / 10.0))
+    if inner is None:
+        inner = 1 if robust else 2
+    if outer is None:
+        outer = 15 if robust else 0
+    s_window, t_window, l_window = [_odd_window(w) for w in (s_window, t_window, l_window)]
+    
+    trend = np.zeros(n)
+    rw = None
+    for k in range(outer + 1):
+        for i in range(inner):
+            c = _cycle_subseries_smooth(y - trend, period, s_window, s_degree, s_jump, rw)
+            low = _moving_average(_moving_average(_moving_average(c, period), period), 3)
+            low = _loess(low, l_window, l_degree, l_jump)
+            seasonal = c[period:n + period] - low
+            trend = _loess(y - seasonal, t_window, t_degree, t_jump, rw)
+        if k < outer:
+            rw = _robustness_weights(y, seasonal + trend)
+    if periodic:
+        cycle = np.arange(n) % period
+        seasonal = (np.bincount(cycle, weights = seasonal) / np.bincount(cycle))[cycle]
+    remainder = y - seasonal - trend
+    return seasonal, trend, remainder
+
+
+def _r_stl(values, frequency, s_window, **kwargs):
+    """
+    reference backend that runs R's stats::stl through rpy2, kept for
+    numerical cross-checks of stl
+    """
+    from rpy2.robjects import r, FloatVector
+    length = len(values)
+    s = r.ts(FloatVector(values), frequency=frequency)
+    kwargs = {key.replace('_', '.'):value for key, value in kwargs.items()}
+    decomposed = r.stl(s, s_window, **kwargs).rx2('time.series')
+    seasonal, trend, remainder = np.fromiter(decomposed, dtype = float, count = 3 * length).reshape(3, length)
+    return seasonal, trend, remainder
+
+
+_backends = {'numpy': stl, 'r': _r_stl}
+
+
+def _get_backend(backend):
+    if callable(backend):
+        return backend
+    try:
+        return _backends[backend]
+    except KeyError:
+        raise ValueError("backend must be 'numpy', 'r' or a function")
+
+
+def _decompose_chunk(task):
+    """
+    worker for decompose_batch, decomposes a chunk of arrays in one process
+    """
+    backend, frequency, s_window, log, kwargs, chunk = task
+    engine = _get_backend(backend)
+    results = []
+    for values in chunk:
+        if log: values = np.log(values)
+        results.append(engine(values, frequency, s_window, **kwargs))
+    return results
+
+
+def decompose_batch(data, frequency, s_window = 'periodic', log = False, workers = None, 
+                    chunksize = 16, backend = 'numpy', **kwargs):
+    '''
+    Decompose many time series at once, fanning the decompositions out 
+    over a pool of worker processes.  Only the values are sent to the 
+    workers, and the results are returned as one long dataframe.
+    
+    params:
+        data: a pandas dataframe with one series per column, or an 
+              iterable of pandas series
+        
+        frequency: the number of observations per “cycle” 
+        
+        s_window: see decompose
+        
+        log:    boolean.  take log of each series
+        
+        workers: number of worker processes, defaults to the number of 
+                 cores.  1 decomposes in this process
+        
+        chunksize: number of series sent to a worker at a time
+        
+        backend: 'numpy', 'r' or a module level function with the 
+                 signature of stl, see decompose
+        
+        **kwargs: other params for stl
+    
+    returns:
+        df: dataframe with columns variable, date, observed, trend, 
+            seasonal and residuals
+    '''
+    if isinstance(data, pd.DataFrame):
+        data = [data[column] for column in data.columns]
+    names = []
+    dates = []
+    observed = []
+    for i, series in enumerate(data):
+        names.append(series.name if series.name is not None else i)
+        dates.append(series.index)
+        observed.append(np.asarray(series, dtype = float))
+    _get_backend(backend) # fail before starting any workers
+    chunks = [observed[i:i + chunksize] for i in range(0, len(observed), chunksize)]
+    tasks = [(backend, frequency, s_window, log, kwargs, chunk) for chunk in chunks]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+    if workers <= 1:
+        results = map(_decompose_chunk, tasks)
+    else:
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            results = list(executor.map(_decompose_chunk, tasks))
+    results = [result for chunk in results for result in chunk]
+    if not results:
+        return pd.DataFrame(columns = ['variable', 'date', 'observed', 'trend', 'seasonal', 'residuals'])
+    if log: observed = [np.log(values) for values in observed]
+    seasonal, trend, remainder = [np.concatenate(part) for part in zip(*results)]
+    df = pd.DataFrame({
+        'variable': np.repeat(names, [len(values) for values in observed]),
+        'date': np.concatenate([np.asarray(date) for date in dates]),
+        'observed': np.concatenate(observed),
+        'trend': trend,
+        'seasonal': seasonal,
+        'residuals': remainder,
+    })
+    return df
+
+
+@cached
+def decompose(series, frequency, s_window = 'periodic', log = False, theme = False, backend = 'numpy', **kwargs):
     '''
     Decompose a time series into seasonal, trend and irregular components using loess, 
     acronym STL.
@@ -32,41 +331,52 @@ def decompose(series, frequency, s_window = 'periodic', log = False, theme = Fal
         
         theme:  a bokeh theme
         
+        backend: 'numpy' for the in-process stl, 'r' to run R's stl 
+                 through rpy2 as a reference, or a function with the 
+                 signature of stl
+        
         **kwargs:  See other params for stl at 
            https://www.rdocumentation.org/packages/stats/versions/3.4.3/topics/stl
+           with "." replaced by "_", e.g. t_window, robust
     '''
         
     df = pd.DataFrame()
     df['date'] = series.index
     if log: series = series.pipe(np.log)
-    s = [x for x in series.values]
-    length = len(series)
-    s = r.ts(s, frequency=frequency)
-    decomposed = [x for x in r.stl(s, s_window).rx2('time.series')]
-    df['observed'] = series.values
-    df['trend'] = decomposed[length:2*length]
-    df['seasonal'] = decomposed[0:length]
-    df['residuals'] = decomposed[2*length:3*length]
+    values = np.asarray(series, dtype = float)
+    engine = _get_backend(backend)
+    seasonal, trend, remainder = engine(values, frequency, s_window, **kwargs)
+    df['observed'] = values
+    df['trend'] = trend
+    df['seasonal'] = seasonal
+    df['residuals'] = remainder
     return df
         
 
-def stl_plot(series, frequency, title = '', theme = False, **kwargs):
-    df = decompose(series, frequency = frequency)
-    plot_list = []
-    x = df['date']
-    columns = ['observed', 'trend', 'seasonal', 'residuals']
-    for column in columns:
-        y = df[column]
-        p = bk_line(x,y, title = title, x_axis_type = 'datetime', **kwargs)
-        p.yaxis.axis_label = column
+def stl_plot(series, frequency, title = '', theme = False, max_points = None, **kwargs):
+    from eda.line import bk_line
+    from eda.autocorrelation import autocor
+    from bokeh.io import curdoc
+    from bokeh.layouts import gridplot
+    with stage('stl_plot', 'compute', rows = len(series)):
+        df = decompose(series, frequency = frequency)
+    with stage('stl_plot', 'figure', rows = len(df)):
+        plot_list = []
+        x = df['date']
+        columns = ['observed', 'trend', 'seasonal', 'residuals']
+        for column in columns:
+            y = df[column]
+            p = bk_line(x,y, title = title, x_axis_type = 'datetime', max_points = max_points, **kwargs)
+            p.yaxis.axis_label = column
+            plot_list.append(p)
+        # with max_points the residual acf is cut to as many lags
+        p = autocor(df['residuals'], max_lag = max_points)
+        p.title.visible = False
+        p.yaxis.axis_label = 'residual autocorrelation'
         plot_list.append(p)
-    p = df['residuals'].pipe(autocor)
-    p.title.visible = False
-    p.yaxis.axis_label = 'residual autocorrelation'
-    plot_list.append(p)
-    p = gridplot(plot_list, ncols=1, plot_height = 225, plot_width = 800)
-    if theme:
-        doc = curdoc()
-        doc.theme = theme
-        doc.add_root(p)
+        p = gridplot(plot_list, ncols=1, plot_height = 225, plot_width = 800)
+        if theme:
+            doc = curdoc()
+            doc.theme = theme
+            doc.add_root(p)
     return p
\ No newline at end of file
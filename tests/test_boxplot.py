@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+from eda.boxplot import boxplot_data, ts_box_data
+
+COLUMNS = ['q1', 'q2', 'q3', 'iq', 'lower_inner_fence', 'upper_inner_fence', 
+           'lower_outer_fence', 'upper_outer_fence', 'upper_whisker', 'lower_whisker']
+
+
+def _loop_ts_box_data(series, freq):
+    """
+    the per-bucket loop ts_box_data replaced
+    """
+    rows = []
+    names = []
+    ol = []
+    for name, group in series.groupby(pd.Grouper(freq = freq)):
+        s = pd.Series(group.values)
+        s = s[~((s-s.mean()).abs()>4*s.std())]
+        d, outliers = boxplot_data(s)
+        rows.append(d)
+        names.append(name)
+        ol.append(pd.DataFrame({'outliers': outliers.values, 'date': name}))
+    df = pd.DataFrame(rows, index = pd.Index(names, name = 'date'))
+    return df, pd.concat(ol).set_index('date')
+
+
+def _series(n = 5000, seed = 0, tz = None):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2000-01-01', periods = n, freq = 'h', tz = tz)
+    values = rng.standard_normal(n).cumsum() + rng.standard_t(2, n) * 3
+    return pd.Series(values, index = index)
+
+
+def _check(series, freq):
+    df, ol = ts_box_data(series, freq = freq)
+    expected, expected_ol = _loop_ts_box_data(series, freq)
+    assert list(df.index) == list(expected.index)
+    np.testing.assert_allclose(df[COLUMNS].values.astype(float), expected[COLUMNS].values.astype(float), 
+                               rtol = 1e-12, atol = 1e-12)
+    for date in expected.index:
+        got = np.sort(ol.loc[ol.index == date, 'outliers'].values)
+        want = np.sort(expected_ol.loc[expected_ol.index == date, 'outliers'].values)
+        np.testing.assert_array_equal(got, want)
+
+
+def test_ts_box_data_sorted():
+    _check(_series(), 'W')
+
+
+def test_ts_box_data_unsorted():
+    s = _series()
+    _check(s.iloc[::-1], 'W')
+    _check(s.sample(frac = 1, random_state = 0), 'MS')
+
+
+def test_ts_box_data_gaps():
+    s = _series()
+    s = s[(s.index < '2000-02-01') | (s.index >= '2000-04-15')]
+    s.iloc[::7] = np.nan
+    _check(s.iloc[::-1], 'W')
+
+
+def test_ts_box_data_tz_aware():
+    s = _series(tz = 'US/Pacific')
+    _check(s.sample(frac = 1, random_state = 1), 'W')
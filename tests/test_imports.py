@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+Importing the package must stay cheap: bokeh, scikit-learn and rpy2 are
+loaded only when a figure, a sklearn fit or the R backend is used.
+"""
+
+import subprocess
+import sys
+
+HEAVY = ('bokeh', 'sklearn', 'rpy2')
+
+MODULES = ('eda.plot', 'eda.autocorrelation', 'eda.boxplot', 'eda.cache', 'eda.control', 
+           'eda.downsample', 'eda.io', 'eda.matrix', 'eda.payload', 'eda.profiling', 'eda.stl')
+
+
+def _loaded(module):
+    code = ("import sys\n"
+            "import {}\n"
+            "print(' '.join(sorted(name for name in sys.modules if name.split('.')[0] in {!r})))"
+            ).format(module, HEAVY)
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return output.decode().split()
+
+
+def test_imports_stay_light():
+    for module in MODULES:
+        assert _loaded(module) == [], module
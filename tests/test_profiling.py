@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+
+from eda.profiling import Profile, stage
+
+
+def test_serialize_emits_rows():
+    from bokeh.plotting import figure
+    emitted = []
+    p = figure()
+    p.line([1, 2, 3], [3, 1, 2])
+    with Profile(memory = False, callback = emitted.append) as prof, Profile(memory = False) as other:
+        item = prof.serialize(p, 'line')
+    assert emitted[-1]['stage'] == 'serialize'
+    assert emitted[-1]['rows'] == len(item)
+    assert other.records[-1]['rows'] == len(item)
+
+
+def test_stage_without_profile():
+    with stage('f', 'compute', rows = 3) as frame:
+        frame['rows'] = 4
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+from eda.stl import stl, _r_stl, _nextodd
+from math import ceil
+
+PERIOD = 12
+
+
+def _series(n = 240, outliers = False, seed = 0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    y = 10 * np.sin(2 * np.pi * t / PERIOD) + .05 * t + np.sqrt(t + 1) + rng.standard_normal(n)
+    if outliers:
+        y[rng.choice(n, 10, replace = False)] += 30
+    return y
+
+
+def _statsmodels_stl(y, period, s_window, s_degree = 0, robust = False):
+    """
+    statsmodels' STL with R's stl defaults, the trend and seasonal it 
+    returns and, for s_window = 'periodic', the seasonal averaged over
+    each cycle position as R does
+    """
+    STL = pytest.importorskip('statsmodels.tsa.seasonal').STL
+    n = len(y)
+    periodic = s_window == 'periodic'
+    if periodic:
+        s_window = 10 * n + 1
+        s_degree = 0
+    t_window = _nextodd(ceil(1.5 * period / (1 - 1.5 / s_window)))
+    l_window = _nextodd(period)
+    fit = STL(y, period = period, seasonal = s_window, trend = t_window, low_pass = l_window,
+              seasonal_deg = s_degree, trend_deg = 1, low_pass_deg = 1, robust = robust,
+              seasonal_jump = int(ceil(s_window / 10.0)), trend_jump = int(ceil(t_window / 10.0)),
+              low_pass_jump = int(ceil(l_window / 10.0))).fit(inner_iter = 1 if robust else 2, 
+                                                              outer_iter = 15 if robust else 0)
+    seasonal = np.asarray(fit.seasonal)
+    if periodic:
+        cycle = np.arange(n) % period
+        seasonal = (np.bincount(cycle, weights = seasonal) / np.bincount(cycle))[cycle]
+    return seasonal, np.asarray(fit.trend)
+
+
+def _check(y, s_window, **kwargs):
+    seasonal, trend, remainder = stl(y, PERIOD, s_window, **kwargs)
+    expected_seasonal, expected_trend = _statsmodels_stl(y, PERIOD, s_window, **kwargs)
+    np.testing.assert_allclose(trend, expected_trend, rtol = 0, atol = 1e-10)
+    np.testing.assert_allclose(seasonal, expected_seasonal, rtol = 0, atol = 1e-10)
+    np.testing.assert_allclose(seasonal + trend + remainder, y, rtol = 0, atol = 1e-10)
+
+
+def test_stl_periodic():
+    _check(_series(), 'periodic')
+
+
+def test_stl_windowed():
+    _check(_series(), 13)
+    _check(_series(seed = 1), 7, s_degree = 1)
+
+
+def test_stl_robust():
+    _check(_series(outliers = True), 13, robust = True)
+
+
+def test_stl_matches_r():
+    pytest.importorskip('rpy2')
+    try:
+        from rpy2.robjects import r
+        r('stats::stl')
+    except Exception:
+        pytest.skip('R is not available')
+    y = _series(outliers = True)
+    for s_window, kwargs in [('periodic', {}), (13, {}), (13, {'robust': True})]:
+        got = stl(y, PERIOD, s_window, **kwargs)
+        expected = _r_stl(y, PERIOD, s_window, **kwargs)
+        for a, b in zip(got, expected):
+            np.testing.assert_allclose(a, b, rtol = 0, atol = 1e-8)
+
+
+def test_stl_rejects_short_series():
+    with pytest.raises(ValueError):
+        stl(_series(n = 20), PERIOD)